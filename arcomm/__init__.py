@@ -8,8 +8,8 @@ import sys
 __version_info__ = (2, 2, 22)
 __version__ = '2.2.22'
 
-if sys.version_info < (2, 7):
-    raise RuntimeError('You need Python 2.7+ for arcomm.')
+if sys.version_info < (3, 6):
+    raise RuntimeError('You need Python 3.6+ for arcomm.')
 
 __title__ = 'arcomm'
 __description__ = 'Library for connecting to Arista switches'
@@ -19,23 +19,66 @@ __uri__ = 'https://github.com/aristanetworks/arcomm'
 __license__ = 'MIT License'
 __copyright__ = '2016 Arista Networks, Inc.'
 
-from arcomm import util
-from arcomm.api import (background, batch, configure, connect, creds, execute,
-                        tap)
-
-#
-# old v1 funcs
-#
-from arcomm.api import (authorize, authorized, clone, create_pool, execute_once,
-                        execute_pool, execute_bg, execute_until, close,
-                        get_credentials)
-
-from arcomm.async import Pool
-from arcomm.command import Command, commands_from_list, command_from_dict, mkcmd
-from arcomm.credentials import Creds, BasicCreds
-from arcomm.session import session, Session
-from arcomm.protocols import BaseProtocol
-from arcomm.response import (ResponseStore, Response, get_subscribers,
-                             subscribe, unsubscribe)
-from arcomm.exceptions import (ConnectFailed, AuthenticationFailed,
-                               AuthorizationFailed, ExecuteFailed)
+import importlib
+import types
+
+# public names and the modules they come from. Nothing is imported until a
+# name is first used, so `import arcomm` stays cheap for short-lived scripts
+_LAZY = {
+    "arcomm.api": (
+        "background", "batch", "configure", "connect", "creds", "execute",
+        "pipeline", "poll", "rollout", "tap",
+        # old v1 funcs
+        "authorize", "authorized", "clone", "create_pool", "execute_once",
+        "execute_pool", "execute_bg", "execute_until", "close",
+        "get_credentials"),
+    "arcomm.async": ("Pool",),
+    "arcomm.command": ("Command", "commands_from_list", "command_from_dict",
+                       "mkcmd"),
+    "arcomm.credentials": ("Creds", "BasicCreds"),
+    "arcomm.session": ("session", "AsyncSession", "Session"),
+    "arcomm.protocols": ("BaseProtocol",),
+    "arcomm.response": ("ResponseStore", "Response", "get_subscribers",
+                        "subscribe", "unsubscribe"),
+    "arcomm.exceptions": ("ConnectFailed", "AuthenticationFailed",
+                          "AuthorizationFailed", "ExecuteFailed")
+}
+
+_ORIGINS = dict((name, module) for module, names in _LAZY.items()
+                for name in names)
+
+__all__ = sorted(_ORIGINS)
+
+class _LazyModule(types.ModuleType):
+    """Imports public names and submodules on first access"""
+
+    def __getattr__(self, name):
+        if name in _ORIGINS:
+            value = getattr(importlib.import_module(_ORIGINS[name]), name)
+        elif not name.startswith("__"):
+            try:
+                value = importlib.import_module(__name__ + "." + name)
+            except ImportError as exc:
+                if exc.name != __name__ + "." + name:
+                    raise
+                raise AttributeError("module {!r} has no attribute {!r}"
+                                     .format(__name__, name))
+        else:
+            raise AttributeError(name)
+
+        setattr(self, name, value)
+        return value
+
+    def __setattr__(self, name, value):
+        # importing a submodule named like a public function, e.g.
+        # arcomm.session, must not replace the function
+        if (name in _ORIGINS and isinstance(value, types.ModuleType) and
+                value.__name__ == __name__ + "." + name):
+            return
+        super(_LazyModule, self).__setattr__(name, value)
+
+    def __dir__(self):
+        return sorted(set(super(_LazyModule, self).__dir__()) |
+                      set(_ORIGINS))
+
+sys.modules[__name__].__class__ = _LazyModule
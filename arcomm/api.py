@@ -7,21 +7,32 @@
 
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
+import importlib
 import re
 import sys
 import time
 
 from arcomm.session import Session
 from arcomm.util import to_list
-from arcomm.async import Pool
 from arcomm.credentials import BasicCreds, mkcreds
 from arcomm.command import Command
+from arcomm.pipeline import Pipeline
+from arcomm.poller import Poller
+from arcomm.registry import get_registry
+from arcomm.rollout import Rollout
+
+# 'async' is a keyword from Python 3.7, the module can't be named in an import
+# statement
+Pool = importlib.import_module("arcomm.async").Pool
+
+# options `Session` takes when it is created rather than on each send
+_SESSION_OPTIONS = ("cache", "coalesce", "retry")
 
 import warnings
 
 __all__ = ['authorize', 'authorized', 'background', 'batch', 'clone', 'close',
            'configure', 'connect',  'creds', 'execute', 'execute_until',
-           'get_credentials', 'tap']
+           'get_credentials', 'pipeline', 'poll', 'rollout', 'tap']
 
 def authorize(connection, secret=''):
     """Authorize the given connection for elevated privileges"""
@@ -40,6 +51,38 @@ def background(endpoints, commands, **kwargs):
     :param creds: (optional) :class:`Creds <Creds>` object with authentication
                              credentials
     :param protocol: (optional) Protocol name, e.g. 'ssh' or 'eapi'
+    :param engine: (optional) Pool engine, 'process', 'thread', 'asyncio' or
+                   'hybrid'
+    :param ordered: (optional) set to False to iterate results as soon as
+                    each host is finished
+    :param shared: (optional) reuse a long-lived engine between calls
+    :param keep_sessions: (optional) keep sessions connected in the workers
+                          for the next batch, best combined with `shared`
+    :param max_sessions: (optional) maximum hosts running at once
+    :param rate: (optional) maximum new hosts started per second
+    :param groups: (optional) limits per group of hosts, see
+                   :class:`Limiter <arcomm.ratelimit.Limiter>`
+    :param host_timeout: (optional) seconds each host may run before it is
+                         reported as 'timedout'
+    :param deadline: (optional) seconds the whole batch may run
+    :param adaptive: (optional) adjust the number of hosts running at once
+                     from observed latency and failures
+    :param retry: (optional) number of attempts or a
+                  :class:`RetryPolicy <arcomm.retry.RetryPolicy>` for retrying
+                  failed connects and read-only commands on each host
+    :param spool: (optional) path of a JSON Lines file (gzipped if it ends
+                  with '.gz') to write results to as they finish, results
+                  are then :class:`SpooledResult
+                  <arcomm.spool.SpooledResult>` handles that load the output
+                  on demand
+    :param chunksize: (optional) hand hosts to the workers this many at a
+                      time to cut dispatch overhead for large inventories
+    :param longest_first: (optional) start the hosts that took longest in
+                          previous runs first, see
+                          :class:`History <arcomm.history.History>`
+    :param pack: (optional) with the 'process' and 'hybrid' engines results
+                 come back without their session (``res.session`` is None),
+                 set to False to keep it
     :return: :class:`Pool <Pool>` object
     :rtype: arcomm.async.Pool
 
@@ -73,6 +116,38 @@ def batch(endpoints, commands, **kwargs):
     :param creds: (optional) :class:`Creds <Creds>` object with authentication
                              credentials
     :param protocol: (optional) Protocol name, e.g. 'ssh' or 'eapi'
+    :param engine: (optional) Pool engine, 'process', 'thread', 'asyncio' or
+                   'hybrid'
+    :param ordered: (optional) set to False to yield each result as soon as
+                    its host is finished
+    :param shared: (optional) reuse a long-lived engine between calls
+    :param keep_sessions: (optional) keep sessions connected in the workers
+                          for the next batch, best combined with `shared`
+    :param max_sessions: (optional) maximum hosts running at once
+    :param rate: (optional) maximum new hosts started per second
+    :param groups: (optional) limits per group of hosts, see
+                   :class:`Limiter <arcomm.ratelimit.Limiter>`
+    :param host_timeout: (optional) seconds each host may run before it is
+                         reported as 'timedout'
+    :param deadline: (optional) seconds the whole batch may run
+    :param adaptive: (optional) adjust the number of hosts running at once
+                     from observed latency and failures
+    :param retry: (optional) number of attempts or a
+                  :class:`RetryPolicy <arcomm.retry.RetryPolicy>` for retrying
+                  failed connects and read-only commands on each host
+    :param spool: (optional) path of a JSON Lines file (gzipped if it ends
+                  with '.gz') to write results to as they finish, results
+                  are then :class:`SpooledResult
+                  <arcomm.spool.SpooledResult>` handles that load the output
+                  on demand
+    :param chunksize: (optional) hand hosts to the workers this many at a
+                      time to cut dispatch overhead for large inventories
+    :param longest_first: (optional) start the hosts that took longest in
+                          previous runs first, see
+                          :class:`History <arcomm.history.History>`
+    :param pack: (optional) with the 'process' and 'hybrid' engines results
+                 come back without their session (``res.session`` is None),
+                 set to False to keep it
 
     Usage:
         >>> pool = arcomm.batch(['veos1', 'veos2'], ['show version'])
@@ -83,8 +158,8 @@ def batch(endpoints, commands, **kwargs):
     endpoints = to_list(endpoints)
     with Pool(endpoints, commands, **kwargs) as pool:
         try:
-            for item in pool.results:
-                yield item.get()
+            for item in pool:
+                yield item
         except KeyboardInterrupt:
             print('Caught interrupt')
             pool.kill()
@@ -110,13 +185,17 @@ def configure(endpoint, commands,  **kwargs):
 
     execute(endpoint, commands,  **kwargs)
 
-def connect(endpoint, creds=None, protocol=None, **kwargs):
+def connect(endpoint, creds=None, protocol=None, reuse=False, **kwargs):
     """Construct a :class:`Session <Session>` and make the connection
 
     :param endpoint: remote host or URI to connect to
     :param creds: (optional) :class:`Creds <Creds>` object with authentication
                              credentials
     :param protocol: (optional) Protocol name, e.g. 'ssh' or 'eapi'
+    :param reuse: (optional) take a live session for the same host, protocol,
+                  credentials and port from the process-wide
+                  :class:`SessionRegistry <arcomm.registry.SessionRegistry>`
+                  if there is one. :func:`close` returns it to the registry
 
     Usage:
         >>> import arcomm
@@ -125,6 +204,18 @@ def connect(endpoint, creds=None, protocol=None, **kwargs):
     if isinstance(creds, (tuple, list)):
         creds = BasicCreds(*creds)
 
+    if reuse:
+        registry = get_registry()
+        sess = registry.checkout(endpoint, creds=creds, protocol=protocol,
+                                 **kwargs)
+        if not sess.connected:
+            try:
+                sess.connect()
+            except Exception:
+                registry.discard(sess)
+                raise
+        return sess
+
     sess = Session(endpoint, creds=creds, protocol=protocol, **kwargs)
     sess.connect()
 
@@ -139,7 +230,7 @@ def creds(username, password="", **kwargs):
 get_credentials = creds
 
 def execute(endpoint, commands, creds=("admin", ""), protocol=None,
-            authorize=None, **kwargs):
+            authorize=None, reuse=False, **kwargs):
     """Send exec commands
 
     :param authorize: enter enable mode
@@ -148,16 +239,43 @@ def execute(endpoint, commands, creds=("admin", ""), protocol=None,
     :param creds: (optional) :class:`Creds <Creds>` object with authentication
                              credentials
     :param protocol: (optional) Protocol name, e.g. 'ssh' or 'eapi'
+    :param reuse: (optional) run on a live session from the process-wide
+                  :class:`SessionRegistry <arcomm.registry.SessionRegistry>`
+                  and leave it there for the next call. Sessions are shared
+                  by host, protocol, transport, port and credentials, a
+                  reused session keeps the `cache`, `coalesce` and `retry`
+                  options it was created with
+    :param cache: (optional) answer read-only commands from a
+                  :class:`ResponseCache <arcomm.cache.ResponseCache>` while
+                  their output is fresh. True uses the cache shared by the
+                  whole process, a dict of options creates a new one
+    :param coalesce: (optional) share the response of an identical read-only
+                     request already in flight to the same host instead of
+                     sending another one. True uses a
+                     :class:`SingleFlight <arcomm.coalesce.SingleFlight>`
+                     shared by the whole process
 
     Usage:
         >>> arcomm.configure('eapi://veos', ['show version'])
         <ResponseStore [ok]>
     """
 
+    if reuse and not isinstance(endpoint, Session):
+        with get_registry().session(endpoint, creds=creds, protocol=protocol,
+                                    **kwargs) as sess:
+            if authorize is not None:
+                sess.authorize(authorize, None)
+            # session options were used when it was created
+            options = dict((key, value) for key, value in kwargs.items()
+                           if key not in _SESSION_OPTIONS)
+            return sess.send(commands, **options)
+
     # allow an existing session to be used
     if not isinstance(endpoint, Session):
         sess = Session(endpoint, creds=creds, protocol=protocol, **kwargs)
-        sess.connect()
+        if sess.cache is None:
+            # with a cache, only connect if something has to be sent
+            sess.connect()
     else:
         sess = endpoint
 
@@ -170,6 +288,80 @@ def execute(endpoint, commands, creds=("admin", ""), protocol=None,
 
 send = execute
 
+def pipeline(endpoints, commands, **kwargs):
+    """Send commands to multiple endpoints, connecting to the next hosts
+    while others are still running their commands
+
+    :param endpoints: remote hosts or URIs to connect to
+    :param commands: command or commands to send
+    :param connectors: (optional) hosts connecting at once
+    :param executors: (optional) hosts running commands at once
+    :param processors: (optional) threads running `postprocess`
+    :param queue_size: (optional) connected hosts allowed to wait for an
+                       execute slot
+    :param postprocess: (optional) function applied to each result
+    :param ordered: (optional) yield results in the order of endpoints
+    :return: :class:`Pipeline <arcomm.pipeline.Pipeline>` object
+    :rtype: arcomm.pipeline.Pipeline
+
+    Usage:
+        >>> for res in arcomm.pipeline(hosts, ['show version'],
+        ...                            connectors=32, executors=8):
+        ...     print(res.to_yaml())
+    """
+    return Pipeline(endpoints, commands, **kwargs)
+
+def poll(endpoints, commands, condition, **kwargs):
+    """Run commands on every endpoint until its output matches condition,
+    polling the whole fleet from one scheduler
+
+    :param endpoints: remote hosts, URIs or sessions to poll
+    :param commands: command or commands to send
+    :param condition: regular expression or callable taking the response
+    :param exclude: (optional) wait for the condition to stop matching
+    :param interval: (optional) seconds between polls of a host
+    :param backoff: (optional) multiply the interval by this after each poll
+    :param deadline: (optional) seconds the whole fleet may take
+    :param callback: (optional) called with each response as its host
+                     converges
+    :return: :class:`Poller <arcomm.poller.Poller>` object, iterate it or
+             call `run` to poll
+    :rtype: arcomm.poller.Poller
+
+    Usage:
+        >>> poller = arcomm.poll(hosts, ['show version'], '4.20.1F',
+        ...                      interval=10, backoff=1.5, deadline=1800)
+        >>> summary = poller.run()
+        >>> print(summary['pending'])
+    """
+    return Poller(endpoints, commands, condition, **kwargs)
+
+def rollout(endpoints, commands, **kwargs):
+    """Send commands to endpoints in waves, starting with a canary host and
+    stopping before the next hosts if too many fail
+
+    :param endpoints: remote hosts or URIs to connect to
+    :param commands: command or commands to send
+    :param waves: (optional) list of waves, see
+                  :class:`Rollout <arcomm.rollout.Rollout>`
+    :param max_error_rate: (optional) fraction of a wave's hosts allowed to
+                           fail, by default any failure aborts
+    :param pause: (optional) seconds to wait between waves
+    :param configure: (optional) wrap the commands in configure/end
+    :return: :class:`Rollout <arcomm.rollout.Rollout>` object, iterate it to
+             run the waves
+    :rtype: arcomm.rollout.Rollout
+
+    Usage:
+        >>> rollout = arcomm.rollout(hosts, ['ntp server 10.0.0.1'],
+        ...                          configure=True, max_error_rate=.01)
+        >>> for res in rollout:
+        ...     print(res.host, res.status)
+        >>> if rollout.aborted:
+        ...     print('aborted in wave', rollout.aborted, rollout.skipped)
+    """
+    return Rollout(endpoints, commands, **kwargs)
+
 def tap(callback, func, *args, **kwargs):
     """What does this even accomplish..."""
     result = func(*args, **kwargs)
@@ -184,8 +376,13 @@ def clone(connection, endpoint=None, **kwargs):
 #     pass
 
 def close(connection):
-    """Close the connection"""
-    connection.close()
+    """Close the connection, sessions from :func:`connect` with ``reuse=True``
+    are returned to the registry instead"""
+    registry = get_registry()
+    if registry.owns(connection):
+        registry.checkin(connection)
+    else:
+        connection.close()
 
 def configure(connection, commands, *args, **kwargs):
     """Similar to execute, but wraps the commands in a configure/end block"""
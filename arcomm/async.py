@@ -1,14 +1,77 @@
-import multiprocessing as mp
 import arcomm
+import asyncio
+import collections
+import functools
+import heapq
+import multiprocessing as mp
+import queue
 import signal
 import sys
+import threading
 import time
 import traceback
 
+from arcomm.command import Command
+from arcomm.exceptions import ProtocolException
+from arcomm.engines import create_engine, get_engine, is_local, \
+                           runs_coroutines, slots
+from arcomm.history import History, longest_first_order
+from arcomm.ratelimit import AdaptiveLimiter, Limiter
+from arcomm.registry import get_registry
+from arcomm.spool import Spool
+from arcomm.util import parse_endpoint
+
+# connected sessions kept by each worker between jobs, see `Pool.keep_sessions`.
+# Shared with `arcomm.connect(reuse=True)` when jobs run in this process
+_SESSIONS = get_registry()
+
 def _prep_worker():
     """Tell workers to ignore interrupts"""
     signal.signal(signal.SIGINT, signal.SIG_IGN)
 
+def _error_store(endpoint, command, error, status="failed", hostname=None):
+    """Build a response for a host that never returned one of its own. The
+    endpoint is only parsed if `hostname` isn't given"""
+    if hostname is None:
+        hostname = parse_endpoint(str(endpoint))["hostname"]
+    responses = arcomm.ResponseStore(None, host=hostname)
+    responses.append((Command(command), error, True))
+    responses.status = status
+    return responses
+
+def _exception_store(endpoint, hostname=None):
+    """Response for a host whose job raised the exception being handled"""
+    exc_type, exc_value, _ = sys.exc_info()
+    return _error_store(endpoint, "!" + exc_type.__name__.lower(),
+                        "[{}] {}".format(exc_type.__name__, exc_value),
+                        hostname=hostname)
+
+def _auth_error_store(session, **kwargs):
+    """Response for a session that failed to log in or authorize"""
+
+    # if we get kicked out of the session... we have to make our own
+    # response object... :(
+    exc_type, exc_value, _ = sys.exc_info()
+    err_type = exc_type.__name__
+    error = "[{}] {}".format(err_type, exc_value)
+    responses = arcomm.ResponseStore(session, **kwargs)
+    responses.append(("!" + err_type.lower(), error, True))
+    return responses
+
+def _apply_deadline(endpoint, kwargs):
+    """Cap the job's timeout at its deadline, returns an error response if
+    the deadline has already passed"""
+
+    deadline = kwargs.pop("deadline", None)
+    if deadline:
+        # let the protocol give up on its own before the deadline passes
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return _error_store(endpoint, "!timeout",
+                                "[Timeout] deadline passed before starting",
+                                status="timedout")
+        kwargs["timeout"] = min(kwargs.get("timeout") or remaining, remaining)
+
 def _worker(endpoint, commands, **kwargs):
 
     creds = None
@@ -27,47 +90,381 @@ def _worker(endpoint, commands, **kwargs):
         authorize = kwargs["authorize"]
         del(kwargs["authorize"])
 
-    session = arcomm.Session(endpoint, creds=creds, protocol=protocol,
-                             authorize=authorize)
+    keep_sessions = kwargs.pop("keep_sessions", False)
+
+    retry = kwargs.pop("retry", None)
+
+    expired = _apply_deadline(endpoint, kwargs)
+    if expired:
+        return expired
+
+    if keep_sessions:
+        if isinstance(keep_sessions, dict):
+            _SESSIONS.configure(**keep_sessions)
+        session = _SESSIONS.checkout(endpoint, creds=creds, protocol=protocol,
+                                     authorize=authorize, retry=retry)
+    else:
+        session = arcomm.Session(endpoint, creds=creds, protocol=protocol,
+                                 authorize=authorize, retry=retry)
+    started = time.time()
     try:
+        if not session.connected:
+            session.connect()
+        connected = time.time()
+
         responses = session.execute(commands, **kwargs)
+        responses.metadata["timings"] = {
+            "connect": connected - started,
+            "execute": time.time() - connected
+        }
     except (arcomm.AuthenticationFailed, arcomm.AuthorizationFailed):
-        # if we get kicked out of the session... we have to make our own
-        # response object... :(
-        exc_type, exc_value, _ = sys.exc_info()
-        err_type = exc_type.__name__
-        error = "[{}] {}".format(err_type, exc_value)
-        responses = arcomm.ResponseStore(session, **kwargs)
-        responses.append(("!" + err_type.lower(), error, True))
+        responses = _auth_error_store(session, **kwargs)
+        if keep_sessions:
+            _SESSIONS.discard(session)
+    except Exception:
+        if keep_sessions:
+            _SESSIONS.discard(session)
+        raise
+    else:
+        if keep_sessions:
+            _SESSIONS.checkin(session)
 
     return responses
 
+def _packed_worker(endpoint, commands, **kwargs):
+    """Same as `_worker` but returns the compact `ResponseStore.to_tuple` form
+    that is cheaper to send back from another process"""
+    return _worker(endpoint, commands, **kwargs).to_tuple()
+
+async def _async_worker(endpoint, commands, **kwargs):
+    """Coroutine version of `_worker` for engines running an event loop. Hosts
+    whose protocol has no async adapter run `_worker` in the loop's
+    executor instead"""
+
+    options = dict((key, kwargs.pop(key, None))
+                   for key in ("creds", "protocol", "authorize", "retry"))
+
+    try:
+        session = arcomm.AsyncSession(endpoint, **options)
+    except (ImportError, ProtocolException):
+        call = functools.partial(_worker, endpoint, commands,
+                                 **dict(kwargs, **options))
+        return await asyncio.get_event_loop().run_in_executor(None, call)
+
+    expired = _apply_deadline(endpoint, kwargs)
+    if expired:
+        return expired
+
+    started = time.time()
+    try:
+        await session.connect()
+        connected = time.time()
+
+        responses = await session.execute(commands, **kwargs)
+        responses.metadata["timings"] = {
+            "connect": connected - started,
+            "execute": time.time() - connected
+        }
+    except (arcomm.AuthenticationFailed, arcomm.AuthorizationFailed):
+        responses = _auth_error_store(session, **kwargs)
+    finally:
+        await session.close()
+
+    return responses
+
+async def _async_packed_worker(endpoint, commands, **kwargs):
+    """`_async_worker` returning the `ResponseStore.to_tuple` form"""
+    return (await _async_worker(endpoint, commands, **kwargs)).to_tuple()
+
+def _chunk_worker(jobs, pack=False):
+    """Run several hosts in one job, returns a (result, exception) pair for
+    each so one failing host doesn't lose the rest of the chunk"""
+
+    worker = _packed_worker if pack else _worker
+
+    results = []
+    for endpoint, commands, params in jobs:
+        try:
+            results.append((worker(endpoint, commands, **params), None))
+        except Exception as exc:
+            results.append((None, exc))
+    return results
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class HostResult(object):
+    """Result for one host of a pool. Works like the `AsyncResult` returned by
+    the engine, waiting first for the job to be handed to the engine"""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self._result = None
+        self._submitted = threading.Event()
+        self._finished = threading.Event()
+
+        # set when the host is given up on before the engine is done with it
+        self._resolved = False
+        self._value = None
+
+        # set once the pool has the host's result, the engine's copy is then
+        # no longer needed
+        self._stored = False
+        self._error = None
+
+        # True if the engine result is for a chunk of hosts
+        self._shared = False
+
+    def __repr__(self):
+        return "<{} [{}]>".format(self.__class__.__name__, self.endpoint)
+
+    @property
+    def resolved(self):
+        """True if the host timed out or was cancelled"""
+        return self._resolved
+
+    @property
+    def submitted(self):
+        return self._submitted.is_set()
+
+    def _submit(self, result, shared=False):
+        self._result = result
+        self._shared = shared
+        self._submitted.set()
+
+    def _finish(self):
+        """Called once the engine is done with the job"""
+        self._finished.set()
+
+    def _resolve(self, value):
+        """Finish with value, whatever the engine returns later is ignored"""
+        self._value = value
+        self._resolved = True
+
+        # ask the engine to stop the job, unless other hosts depend on it.
+        # Its limiter slot is only released once the engine is done with it
+        if (self._result is not None and not self._shared and
+                hasattr(self._result, "cancel")):
+            self._result.cancel()
+
+        self._finished.set()
+
+    def _store(self, value, error=None):
+        """Keep the host's result or exception, dropping the engine's copy"""
+        self._value = value
+        self._error = error
+        self._stored = True
+        self._result = None
+
+    def get(self, timeout=None):
+        if not self._finished.wait(timeout):
+            raise mp.TimeoutError()
+
+        if self._error is not None:
+            raise self._error
+
+        if self._resolved or self._stored:
+            return self._value
+
+        return self._result.get()
+
+    def wait(self, timeout=None):
+        self._finished.wait(timeout)
+
+    def ready(self):
+        return self._finished.is_set()
+
+    def successful(self):
+        if not self.ready():
+            raise ValueError("{!r} not ready".format(self))
+        if self._resolved or self._stored:
+            return self._error is None
+        return self._result.successful()
 
 class Pool:
     """Creates a pool of hosts on which to run a certain set of commands
-    asynchronously"""
+    asynchronously
+
+    :param engine: (optional) how jobs are run, 'process' (the default) uses
+                   a `multiprocessing.Pool`, 'thread' a thread pool sharing
+                   the caller's memory, 'asyncio' drives all sessions from
+                   one event loop and 'hybrid' runs an event loop in each of
+                   `processes` worker processes, for very large fleets. An
+                   engine object from `arcomm.engines.create_engine` may be
+                   passed instead, it is left running when the pool is done
+    :param shared: (optional) run on a long-lived engine reused by every pool
+                   with the same engine and processes, see
+                   `arcomm.engines.get_engine`
+    :param ordered: (optional) iterate results in the order hosts were added
+                    (the default) or as soon as each one finishes
+    :param keep_sessions: (optional) workers keep their sessions connected
+                          after each job so later jobs for the same host, even
+                          from another batch, skip connection setup. May be a
+                          dict of `SessionRegistry` options, e.g.
+                          ``{"maxsize": 200, "idle_timeout": 60}``
+    :param limiter: (optional) `arcomm.ratelimit.Limiter` deciding when each
+                    host may start, may be shared between pools
+    :param max_sessions: (optional) maximum hosts running at once
+    :param rate: (optional) maximum new hosts started per second
+    :param burst: (optional) hosts allowed to start at once after idling,
+                  defaults to `rate`
+    :param groups: (optional) per-group limits, see
+                   `arcomm.ratelimit.Limiter`. Hosts can be tagged with a
+                   ``group`` session parameter or matched by hostname pattern
+    :param host_timeout: (optional) seconds each host may run once started.
+                         Hosts that take longer get a 'timedout' response and
+                         the rest of the batch carries on. Hosts are handed
+                         to the engine as its workers free up, time spent
+                         waiting for one doesn't count
+    :param deadline: (optional) seconds the whole batch may run, hosts not
+                     finished by then get a 'timedout' response
+    :param adaptive: (optional) let an `arcomm.ratelimit.AdaptiveLimiter`
+                     raise the number of hosts running at once while latency
+                     stays flat and back off when it climbs or hosts fail. May
+                     be a dict of its options. `processes` should leave the
+                     engine enough room for the limit to grow into
+    :param chunksize: (optional) hand hosts to the engine this many at a
+                      time, like `multiprocessing.Pool.imap_unordered`. Cuts
+                      the per-host dispatch overhead for large inventories of
+                      short jobs, each chunk's results come back together.
+                      Hosts are still dispatched one at a time when a limiter
+                      or `host_timeout` is used
+    :param longest_first: (optional) start the hosts expected to take
+                          longest first, to shorten the batch on mixed
+                          fleets. Durations are learned from previous runs
+                          and kept in ``~/.arcomm/history.json``, or pass an
+                          `arcomm.history.History`. A ``priority`` session
+                          parameter starts hosts earlier regardless
+    :param spool: (optional) write each result to a JSON Lines file as soon as
+                  it finishes and hand out lightweight
+                  `arcomm.spool.SpooledResult` handles instead, so memory
+                  stays flat however many hosts there are. May be a path (a
+                  '.gz' suffix compresses it), True for a temporary file or an
+                  `arcomm.spool.Spool`
+    :param pack: (optional) engines running in other processes send results
+                 back in the compact `ResponseStore.to_tuple` form, so
+                 ``result.session`` is None. Set to False to send whole
+                 stores, sessions included, at a higher transfer cost
+    """
 
     def __init__(self, sessions, commands=[], callback=None, processes=None,
-                 delay=0, **kwargs):
+                 delay=0, engine=None, ordered=True, shared=False,
+                 keep_sessions=False, limiter=None, max_sessions=None,
+                 rate=None, burst=None, groups=None, host_timeout=None,
+                 deadline=None, adaptive=False, spool=None, chunksize=None,
+                 longest_first=False, pack=None, **kwargs):
 
         self._processes = processes
 
+        self._engine = engine
+
         # delay the return of start- give slower sessions time to initialize
         self._delay = delay
 
         self._callback = callback
 
+        self._ordered = ordered
+
         # commands to be executed on each session
         self._commands = commands
 
         self._session_defaults = kwargs
 
+        if keep_sessions:
+            self._session_defaults["keep_sessions"] = keep_sessions
+
         self._sessions = []
         self.load_sessions(sessions)
 
         self._results = []
 
-        self._pool = mp.Pool(self._processes) # , _prep_worker)
+        # indexes of results in the order they finish
+        self._completed = queue.Queue()
+
+        if limiter is None and adaptive:
+            options = dict(adaptive) if isinstance(adaptive, dict) else {}
+            options.setdefault("maximum", max_sessions or processes)
+            limiter = AdaptiveLimiter(rate=rate, burst=burst, groups=groups,
+                                      **options)
+        elif limiter is None and (max_sessions or rate or groups):
+            limiter = Limiter(max_sessions, rate, burst, groups)
+        self._limiter = limiter
+
+        # when each host was handed to the engine
+        self._started = {}
+
+        # limiter group of each host
+        self._groups = []
+
+        # hands jobs to the engine as the limiter admits them
+        self._dispatcher = None
+        self._stopped = threading.Event()
+
+        self._host_timeout = host_timeout
+        self._deadline = deadline
+
+        self._chunksize = chunksize or 1
+
+        if longest_first is True:
+            longest_first = History()
+        elif longest_first is False:
+            longest_first = None
+        self._history = longest_first
+
+        # indexes of hosts in the order they are started
+        self._order = []
+
+        # absolute time the batch must be done by, set on start
+        self._deadline_at = None
+
+        # (deadline, index) of running hosts
+        self._timers = []
+
+        # gives up on hosts past their deadline
+        self._watchdog = None
+
+        # indexes of hosts already reported
+        self._done = set()
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+        # spools not created here are left open when the pool is done
+        self._own_spool = bool(spool) and not isinstance(spool, Spool)
+        if spool is True:
+            spool = Spool()
+        elif self._own_spool:
+            spool = Spool(spool)
+        self._spool = spool or None
+
+        # engines not created here are left running when the pool is done
+        self._owned = False
+
+        if hasattr(engine, "apply_async"):
+            self._pool = engine
+        elif shared:
+            self._pool = get_engine(engine, self._processes)
+        else:
+            self._pool = create_engine(engine, self._processes)
+            self._owned = True
+
+        # results from other processes are sent back in compact form
+        if pack is None:
+            pack = not is_local(self._pool)
+        self._pack = pack
+
+        # engines with an event loop drive sessions through async adapters
+        self._coroutines = runs_coroutines(self._pool)
+
+        # with a host_timeout, hosts are only handed to the engine when one
+        # of its workers is free, so their timeout starts when they do
+        self._slots = None
+        if host_timeout:
+            if self._limiter is None:
+                self._limiter = Limiter()
+            if slots(self._pool):
+                self._slots = threading.Semaphore(slots(self._pool))
 
     def __enter__(self):
         self.start()
@@ -79,6 +476,11 @@ class Pool:
         pass
 
     def __iter__(self):
+        if not self._ordered:
+            for item in self.as_completed():
+                yield item
+            return
+
         for item in self._results:
             yield item.get()
 
@@ -99,6 +501,14 @@ class Pool:
     def results(self):
         return self._results
 
+    @property
+    def limiter(self):
+        return self._limiter
+
+    @property
+    def spool(self):
+        return self._spool
+
     def load_sessions(self, sessions):
 
         for session in sessions:
@@ -115,22 +525,341 @@ class Pool:
 
         self._sessions.append((endpoint, params))
 
+    def _claim(self, index):
+        """Mark a host as done, only the first claim for a host succeeds"""
+
+        with self._lock:
+            if index in self._done:
+                return False
+            self._done.add(index)
+            self._cond.notify_all()
+            return True
+
+    def _report(self, index, result=None):
+        try:
+            if self._callback and result is not None:
+                self._callback(result)
+        finally:
+            self._completed.put(index)
+
+    def _release(self, index):
+        if self._limiter:
+            self._limiter.release(self._groups[index])
+        if self._slots is not None:
+            self._slots.release()
+
+    def _observe(self, index, result=None, failed=False):
+        """Tell an adaptive limiter how the host went"""
+
+        if not hasattr(self._limiter, "observe"):
+            return
+
+        timings = getattr(result, "metadata", {}).get("timings")
+        if timings:
+            latency = sum(timings.values())
+        else:
+            latency = time.time() - self._started.get(index, time.time())
+
+        self._limiter.observe(latency, failed=failed)
+
+    def _on_result(self, index, result):
+        try:
+            if self._claim(index):
+                if self._pack:
+                    result = arcomm.ResponseStore.from_tuple(result)
+                if self._spool:
+                    result = self._spool.write(result)
+                self._results[index]._store(result)
+                self._observe(index, result)
+                self._record(index, result)
+                self._report(index, result)
+        finally:
+            self._results[index]._finish()
+            self._release(index)
+
+    def _on_error(self, index, exc):
+        try:
+            if self._claim(index):
+                self._results[index]._store(None, exc)
+                self._observe(index, failed=True)
+                self._report(index)
+        finally:
+            self._results[index]._finish()
+            self._release(index)
+
+    def _record(self, index, result):
+        if self._history is None:
+            return
+
+        timings = getattr(result, "metadata", {}).get("timings")
+        if timings:
+            duration = sum(timings.values())
+        else:
+            duration = time.time() - self._started[index]
+
+        endpoint, _ = self._sessions[index]
+        self._history.record(endpoint, self._commands, duration)
+
+    def _on_chunk(self, indexes, results):
+        for index, (result, exc) in zip(indexes, results):
+            if exc is None:
+                self._on_result(index, result)
+            else:
+                self._on_error(index, exc)
+
+    def _on_chunk_error(self, indexes, exc):
+        for index in indexes:
+            self._on_error(index, exc)
+
+    def _give_up(self, index, command, error, status):
+        """Finish a host with an error response without waiting for it"""
+
+        if not self._claim(index):
+            return False
+
+        if status == "timedout":
+            self._observe(index, failed=True)
+
+        endpoint, _ = self._sessions[index]
+        result = _error_store(endpoint, command, error, status)
+        if self._spool:
+            result = self._spool.write(result)
+        self._results[index]._resolve(result)
+        self._report(index, result)
+        return True
+
+    def _job(self, index):
+        """Arguments for the worker and the host's deadline"""
+
+        endpoint, params = self._sessions[index]
+        params = dict(params)
+        params.pop("group", None)
+        params.pop("priority", None)
+
+        deadline = self._deadline_at
+        if self._host_timeout:
+            host_deadline = time.time() + self._host_timeout
+            deadline = min(deadline or host_deadline, host_deadline)
+
+        if deadline:
+            params["deadline"] = deadline
+
+        self._started[index] = time.time()
+
+        return (endpoint, self._commands, params), deadline
+
+    def _submit_chunk(self, indexes):
+        indexes = [index for index in indexes
+                   if not self._results[index].resolved]
+        if not indexes:
+            return
+
+        jobs = [self._job(index)[0] for index in indexes]
+        result = self._pool.apply_async(
+            _chunk_worker, (jobs, self._pack),
+            callback=functools.partial(self._on_chunk, indexes),
+            error_callback=functools.partial(self._on_chunk_error, indexes))
+
+        for index in indexes:
+            self._results[index]._submit(result, shared=True)
+
+    def _submit(self, index):
+        if self._results[index].resolved:
+            # cancelled or timed out before it started
+            self._release(index)
+            return
+
+        (endpoint, commands, params), deadline = self._job(index)
+
+        if self._coroutines and not params.get("keep_sessions"):
+            worker = _async_packed_worker if self._pack else _async_worker
+        else:
+            worker = _packed_worker if self._pack else _worker
+
+        args = (endpoint, commands)
+        result = self._pool.apply_async(
+            worker, args, params,
+            callback=functools.partial(self._on_result, index),
+            error_callback=functools.partial(self._on_error, index))
+        self._results[index]._submit(result)
+
+        if self._host_timeout:
+            with self._cond:
+                heapq.heappush(self._timers, (deadline, index))
+                self._cond.notify_all()
+
+    def _dispatch(self):
+        pending = collections.OrderedDict((index, self._groups[index])
+                                          for index in self._order)
+
+        while pending and not self._stopped.is_set():
+            if self._deadline_at and time.time() >= self._deadline_at:
+                # the watchdog has given up on everything left
+                break
+
+            if self._slots is not None and not self._slots.acquire(timeout=.5):
+                continue
+
+            index = self._limiter.admit(pending.items(), timeout=.5)
+            if index is None:
+                if self._slots is not None:
+                    self._slots.release()
+                continue
+
+            del pending[index]
+            self._submit(index)
+
+        if self._stopped.is_set():
+            for index in pending:
+                self._give_up(index, "!cancelled", "[Cancelled] pool stopped",
+                              "cancelled")
+
+    def _watch(self):
+        """Time out hosts past their own deadline or the batch deadline"""
+
+        while not self._stopped.is_set():
+            expired = []
+
+            with self._cond:
+                if len(self._done) == len(self._results):
+                    return
+
+                now = time.time()
+                if self._deadline_at and now >= self._deadline_at:
+                    expired = [index for index in range(len(self._results))
+                               if index not in self._done]
+                    message = "[Timeout] batch deadline exceeded"
+                else:
+                    while self._timers and self._timers[0][0] <= now:
+                        _, index = heapq.heappop(self._timers)
+                        expired.append(index)
+                    message = "[Timeout] host deadline exceeded"
+
+                if not expired:
+                    wakeups = [when for when in (self._deadline_at,
+                               self._timers[0][0] if self._timers else None)
+                               if when]
+                    wait = min(wakeups) - now if wakeups else None
+                    self._cond.wait(wait)
+                    continue
+
+            for index in expired:
+                self._give_up(index, "!timeout", message, "timedout")
+
     def start(self):
 
-        for endpoint, params in self._sessions:
-            args = (endpoint, self._commands)
-            result = self._pool.apply_async(_worker, args, params,
-                                            callback=self._callback)
-            self._results.append(result)
+        self._results = [HostResult(endpoint)
+                         for endpoint, _ in self._sessions]
+
+        if self._deadline:
+            self._deadline_at = time.time() + self._deadline
+
+        self._order = list(range(len(self._sessions)))
+        if self._history is not None:
+            self._order = longest_first_order(
+                [endpoint for endpoint, _ in self._sessions], self._commands,
+                self._history,
+                [params.get("priority") for _, params in self._sessions])
+
+        if self._deadline or self._host_timeout:
+            self._watchdog = threading.Thread(target=self._watch,
+                                              name="arcomm-watchdog")
+            self._watchdog.daemon = True
+            self._watchdog.start()
+
+        if self._limiter is None and self._chunksize > 1 and \
+                not self._host_timeout:
+            for indexes in _chunks(self._order, self._chunksize):
+                self._submit_chunk(indexes)
+        elif self._limiter is None:
+            for index in self._order:
+                self._submit(index)
+        else:
+            self._groups = [self._limiter.group(endpoint, params)
+                            for endpoint, params in self._sessions]
+            self._dispatcher = threading.Thread(target=self._dispatch,
+                                                name="arcomm-dispatch")
+            self._dispatcher.daemon = True
+            self._dispatcher.start()
 
         time.sleep(self._delay)
 
+    def cancel(self, endpoint):
+        """Cancel the hosts matching endpoint that have not finished yet. They
+        get a 'cancelled' response, returns how many were cancelled"""
+
+        cancelled = 0
+        for index, (_endpoint, _) in enumerate(self._sessions):
+            if _endpoint != endpoint or index >= len(self._results):
+                continue
+            if self._give_up(index, "!cancelled", "[Cancelled] by request",
+                             "cancelled"):
+                cancelled += 1
+
+        return cancelled
+
+    def finished(self):
+        """Yields each host's `HostResult` as soon as it is finished, getting
+        the result is left to the caller"""
+
+        for _ in range(len(self._results)):
+            index = self._completed.get()
+            yield self._results[index]
+
+    def as_completed(self):
+        """Yields each result as soon as its host is finished, regardless of
+        the order the hosts were added"""
+
+        for result in self.finished():
+            yield result.get()
+
     def join(self):
+        try:
+            self._join()
+        finally:
+            # handles read the spool on their own, only stop writing to it
+            if self._own_spool:
+                self._spool.close()
+
+            if self._history is not None:
+                self._history.save()
+
+    def _join(self):
+        if not self._owned:
+            for result in self._results:
+                result.wait()
+            return
+
+        if any(result.resolved for result in self._results):
+            # don't wait on hosts we already gave up on
+            for result in self._results:
+                result.wait()
+            self._pool.terminate()
+            return
+
         self._pool.join()
 
     def close(self):
-        self._pool.close()
+        # every host must be handed to the engine before it can be closed
+        if self._dispatcher:
+            self._dispatcher.join()
+
+        if self._owned:
+            self._pool.close()
+
+    def stop(self):
+        """Stop handing hosts to the engine, those not started yet get a
+        'cancelled' response and running ones are left to finish. Only
+        applies to pools with a limiter, others start every host at once"""
+        self._stopped.set()
 
     def kill(self):
-        """Terminate the pool and empty the queue"""
-        self._pool.terminate()
+        """Terminate the pool and empty the queue. Engines the pool does not
+        own are left running"""
+        self._stopped.set()
+
+        with self._cond:
+            self._cond.notify_all()
+
+        if self._owned:
+            self._pool.terminate()
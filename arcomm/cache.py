@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Cache the output of read-only commands for a short time"""
+
+import collections
+import copy
+import re
+import threading
+import time
+
+from arcomm import env
+
+# process-wide cache, see `get_cache`
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+# commands that only read state
+READONLY_RE = r"^\s*show\s"
+
+def is_readonly(command):
+    """True if the command only reads state and has no interactive answers"""
+    return (not getattr(command, "answer", None)
+            and bool(re.match(READONLY_RE, str(command))))
+
+class ResponseCache(object):
+    """LRU cache of command output keyed by host, command, encoding and
+    privilege level
+
+    Only commands matching `readonly` without interactive answers are
+    cached. A session running anything else bypasses the cache and drops the
+    host's entries, the command may have changed what they show. Errored
+    responses are never cached.
+
+    :param maxsize: (optional) maximum number of entries, the least recently
+                    used is dropped when full
+    :param ttl: (optional) seconds an entry stays fresh
+    :param ttls: (optional) ``{pattern: seconds}`` overriding `ttl` for
+                 commands matching the pattern, the first match wins. 0 stops
+                 a command from being cached, e.g.
+                 ``{"show version": 3600, "show clock": 0}``
+    :param readonly: (optional) pattern for commands safe to cache
+    """
+
+    def __init__(self, maxsize=None, ttl=None, ttls=None, readonly=None):
+        self.maxsize = maxsize or env.ARCOMM_RESPONSE_CACHE_SIZE
+        self.ttl = env.ARCOMM_RESPONSE_CACHE_TTL if ttl is None else ttl
+
+        self._ttls = [(re.compile(pattern), seconds)
+                      for pattern, seconds in (ttls or {}).items()]
+        self._readonly = re.compile(readonly or READONLY_RE)
+
+        # key -> (expires, output, errored)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "<{} [{}/{}]>".format(self.__class__.__name__, len(self),
+                                     self.maxsize)
+
+    def stats(self):
+        """Counters as a dict"""
+        return {"hits": self.hits, "misses": self.misses,
+                "bypasses": self.bypasses, "size": len(self)}
+
+    def ttl_for(self, command):
+        """Seconds the command's output stays fresh"""
+        cmd = str(command).strip()
+        for pattern, seconds in self._ttls:
+            if pattern.match(cmd):
+                return seconds
+        return self.ttl
+
+    def cacheable(self, command):
+        """True if the command only reads state and may be cached"""
+        return (not getattr(command, "answer", None)
+                and bool(self._readonly.match(str(command)))
+                and self.ttl_for(command) > 0)
+
+    def key(self, host, command, encoding="text", privilege=1):
+        return (host, str(command).strip(), encoding, privilege)
+
+    def get(self, key):
+        """Return (output, errored) for a fresh entry or None"""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1:])
+
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+
+    def put(self, key, command, output, errored):
+        if errored:
+            return
+
+        expires = time.time() + self.ttl_for(command)
+
+        with self._lock:
+            self._entries[key] = (expires, copy.deepcopy(output), errored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def bypass(self, host):
+        """Count a bypass and drop the host's entries"""
+        with self._lock:
+            self.bypasses += 1
+        self.invalidate(host)
+
+    def invalidate(self, host=None):
+        """Drop the host's entries, or all of them"""
+        with self._lock:
+            if host is None:
+                self._entries.clear()
+                return
+
+            for key in [key for key in self._entries if key[0] == host]:
+                del self._entries[key]
+
+    clear = invalidate
+
+def get_cache():
+    """The cache shared by every session in this process created with
+    ``cache=True``"""
+
+    global _CACHE
+
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache()
+        return _CACHE
+
+def mkcache(cache):
+    """Build a cache from True (the shared cache), a dict of options or an
+    existing cache"""
+
+    if cache is None or cache is False:
+        return None
+    elif cache is True:
+        return get_cache()
+    elif isinstance(cache, dict):
+        return ResponseCache(**cache)
+
+    return cache
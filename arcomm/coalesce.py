@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Collapse identical requests made at the same time into one"""
+
+import threading
+
+# process-wide instance, see `get_single_flight`
+_FLIGHTS = None
+_FLIGHTS_LOCK = threading.Lock()
+
+class _Call(object):
+    """A request in flight and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+class SingleFlight(object):
+    """Runs one request per key at a time. Callers asking for a key already
+    in flight wait for that request and share its result, or its exception,
+    instead of sending their own
+
+    Works from threads with `do` and from coroutines with `do_async`, which
+    only coalesces callers on the same event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._futures = {}
+
+        # requests answered by another caller's request
+        self.shared = 0
+
+    def __len__(self):
+        return len(self._calls) + len(self._futures)
+
+    def do(self, key, func):
+        """Call func unless a call for key is already running, returns the
+        result and True if it came from another caller's call"""
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            return call.wait(), True
+
+        try:
+            call.value = func()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.value, False
+
+    async def do_async(self, key, func):
+        """Same as `do` for a coroutine function"""
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+        key = (id(loop), key)
+
+        future = self._futures.get(key)
+        if future is not None:
+            self.shared += 1
+            return (await asyncio.shield(future)), True
+
+        future = self._futures[key] = loop.create_future()
+        try:
+            value = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # keep the loop from logging it as never retrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            del self._futures[key]
+
+        return value, False
+
+def get_single_flight():
+    """The instance shared by every session in this process created with
+    ``coalesce=True``"""
+
+    global _FLIGHTS
+
+    with _FLIGHTS_LOCK:
+        if _FLIGHTS is None:
+            _FLIGHTS = SingleFlight()
+        return _FLIGHTS
+
+def mkflight(coalesce):
+    """Build from True (the shared instance) or an existing `SingleFlight`"""
+
+    if coalesce is None or coalesce is False:
+        return None
+    elif coalesce is True:
+        return get_single_flight()
+
+    return coalesce
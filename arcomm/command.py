@@ -5,7 +5,7 @@
 
 """Command module.  stores command and any prompts or answers it may require"""
 from past.builtins import str, basestring
-import collections
+import collections.abc
 import re
 from arcomm.util import to_list
 
@@ -27,7 +27,7 @@ def commands_from_list(commands):
         cmdlist.append(cmd)
     return cmdlist
 
-class Command(collections.MutableMapping):
+class Command(collections.abc.MutableMapping):
     """Object to store command and any prompts or answers it may require"""
 
     def __init__(self, cmd, prompt=None, answer=None):
@@ -7,7 +7,7 @@
 passwords
 """
 
-import collections
+import collections.abc
 import getpass
 
 def mkcreds(username, **kwargs):
@@ -17,7 +17,7 @@ def mkcreds(username, **kwargs):
 def credentials_from_list(creds):
     pass
 
-class BaseCreds(collections.Mapping):
+class BaseCreds(collections.abc.Mapping):
     """Credentials class stores username, passwords, keys"""
     def __init__(self, **kwargs):
         self._creds = dict(**kwargs)
@@ -0,0 +1,584 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Execution engines for :class:`arcomm.async.Pool`
+
+Every engine has the same ``apply_async``, ``close``, ``join`` and
+``terminate`` methods as :class:`multiprocessing.pool.Pool`, so the pool can
+drive any of them the same way"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import concurrent.futures.process
+import functools
+import itertools
+import multiprocessing as mp
+import pickle
+import queue
+import signal
+import threading
+
+from arcomm import env
+
+ENGINES = ("process", "thread", "asyncio", "hybrid")
+
+# long-lived engines shared between pools, see `get_engine`
+_SHARED = {}
+_SHARED_LOCK = threading.Lock()
+
+class FutureResult(object):
+    """Makes a :class:`concurrent.futures.Future` look like the
+    :class:`multiprocessing.pool.AsyncResult` returned by ``apply_async``
+
+    The future is only done, and its callbacks called, once the job has
+    really finished or will never run. `cancel` asks the engine to stop the
+    job"""
+
+    def __init__(self, future, cancel=None):
+        self._future = future
+        self._cancel = cancel or future.cancel
+
+    def get(self, timeout=None):
+        try:
+            return self._future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise mp.TimeoutError()
+
+    def wait(self, timeout=None):
+        concurrent.futures.wait([self._future], timeout)
+
+    def ready(self):
+        return self._future.done()
+
+    def successful(self):
+        if not self.ready():
+            raise ValueError("{!r} not ready".format(self))
+        return not self._future.cancelled() and self._future.exception() is None
+
+    def cancel(self):
+        """Ask the engine to stop the job, returns False if it can't"""
+        return self._cancel()
+
+def _notify(callback, error_callback, future):
+    """Calls the callback matching the outcome of a finished future"""
+    if future.cancelled():
+        if error_callback:
+            error_callback(concurrent.futures.CancelledError())
+        return
+
+    exc = future.exception()
+    if exc is not None:
+        if error_callback:
+            error_callback(exc)
+    elif callback:
+        callback(future.result())
+
+class _FutureEngine(object):
+    """Base for engines built on :class:`concurrent.futures.Future` objects"""
+
+    # jobs run in the caller's process, results are not pickled
+    local = True
+
+    # coroutine functions are awaited on an event loop
+    coroutines = False
+
+    # jobs run at once
+    slots = None
+
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _discard(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _track(self, future, callback=None, error_callback=None, cancel=None):
+        with self._lock:
+            self._pending.add(future)
+
+        future.add_done_callback(self._discard)
+        if callback or error_callback:
+            future.add_done_callback(
+                functools.partial(_notify, callback, error_callback))
+
+        return FutureResult(future, cancel)
+
+    def _wait(self):
+        with self._lock:
+            pending = list(self._pending)
+        concurrent.futures.wait(pending)
+
+    def _cancel(self):
+        with self._lock:
+            pending = list(self._pending)
+
+        for future in pending:
+            future.cancel()
+
+    def close(self):
+        self._closed = True
+
+class ThreadEngine(_FutureEngine):
+    """Runs jobs on a :class:`concurrent.futures.ThreadPoolExecutor`
+
+    Workers share the caller's memory so sessions and responses are never
+    pickled. At most `processes` jobs run at once"""
+
+    def __init__(self, processes=None):
+        super(ThreadEngine, self).__init__()
+        self.slots = processes or env.ARCOMM_DEFAULT_CONCURRENCY
+        self._executor = concurrent.futures.ThreadPoolExecutor(self.slots)
+
+    def apply_async(self, func, args=(), kwds={}, callback=None,
+                    error_callback=None):
+        if self._closed:
+            raise ValueError("Pool not running")
+
+        future = self._executor.submit(func, *args, **kwds)
+        return self._track(future, callback, error_callback)
+
+    def join(self):
+        if not self._closed:
+            raise ValueError("Pool is still running")
+
+        self._executor.shutdown(wait=True)
+
+    def terminate(self):
+        self._closed = True
+        self._cancel()
+        self._executor.shutdown(wait=False)
+
+class AsyncioEngine(_FutureEngine):
+    """Runs jobs from a single asyncio event loop
+
+    The loop runs in a background thread so callers stay synchronous.
+    Coroutine functions are awaited directly on the loop, any other function is
+    handed to the loop's executor. At most `processes` jobs run at once"""
+
+    coroutines = True
+
+    def __init__(self, processes=None):
+        super(AsyncioEngine, self).__init__()
+        self._concurrency = processes or env.ARCOMM_DEFAULT_CONCURRENCY
+        self.slots = self._concurrency
+
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(
+            concurrent.futures.ThreadPoolExecutor(self._concurrency))
+
+        # created on the loop's own thread
+        self._semaphore = None
+
+        # future -> task running the job, only used on the loop's thread
+        self._tasks = {}
+
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,),
+                                        name="arcomm-asyncio")
+        self._thread.daemon = True
+        self._thread.start()
+        started.wait()
+
+    def _run(self, started):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self._concurrency)
+        started.set()
+        self._loop.run_forever()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    async def _run_in_executor(self, func, args, kwds):
+        job = self._loop.run_in_executor(None,
+                                         functools.partial(func, *args, **kwds))
+        try:
+            return await asyncio.shield(job)
+        except asyncio.CancelledError:
+            # the thread can't be stopped, the job is over once it returns
+            await asyncio.wait([job])
+            raise
+
+    async def _call(self, future, func, args, kwds):
+        try:
+            async with self._semaphore:
+                if asyncio.iscoroutinefunction(func):
+                    value = await func(*args, **kwds)
+                else:
+                    value = await self._run_in_executor(func, args, kwds)
+        except (Exception, asyncio.CancelledError) as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(value)
+        finally:
+            del self._tasks[future]
+
+    def _start(self, future, func, args, kwds):
+        if not future.set_running_or_notify_cancel():
+            return
+        self._tasks[future] = self._loop.create_task(
+            self._call(future, func, args, kwds))
+
+    def _stop_job(self, future):
+        task = self._tasks.get(future)
+        if task is not None:
+            task.cancel()
+
+    def _cancel_job(self, future):
+        """Cancels a job not started yet, or its task. A coroutine stops at
+        its next await, a function in the executor is left to return"""
+        if not future.cancel():
+            self._loop.call_soon_threadsafe(self._stop_job, future)
+        return True
+
+    def apply_async(self, func, args=(), kwds={}, callback=None,
+                    error_callback=None):
+        if self._closed:
+            raise ValueError("Pool not running")
+
+        future = concurrent.futures.Future()
+        self._loop.call_soon_threadsafe(self._start, future, func, args, kwds)
+        return self._track(future, callback, error_callback,
+                           functools.partial(self._cancel_job, future))
+
+    def _stop(self):
+        if self._loop.is_closed():
+            return
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
+
+    def join(self):
+        if not self._closed:
+            raise ValueError("Pool is still running")
+
+        self._wait()
+        self._stop()
+
+    def terminate(self):
+        self._closed = True
+        self._cancel()
+        self._stop()
+
+        # jobs left on the stopped loop will never finish
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            if not future.done():
+                future.set_exception(concurrent.futures.CancelledError())
+
+def _encode(token, func, args, kwds, outcome):
+    """Pickle a job's outcome here rather than in the queue's feeder thread,
+    where an unpicklable result would be lost and the job never finish"""
+    try:
+        data = pickle.dumps(outcome, pickle.HIGHEST_PROTOCOL)
+    except Exception as exc:
+        error = TypeError("can't send result of {}: {}".format(func, exc))
+        data = pickle.dumps((False, error), pickle.HIGHEST_PROTOCOL)
+    return (token, data)
+
+def _hybrid_main(inbox, outbox, concurrency):
+    """Body of each hybrid worker process: runs the jobs it is sent on its
+    own event loop, up to `concurrency` at once"""
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(concurrency))
+
+    # reading the inbox blocks, keep it off the job threads
+    reader = concurrent.futures.ThreadPoolExecutor(1)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(token, data):
+        func = args = kwds = None
+        async with semaphore:
+            try:
+                func, args, kwds = pickle.loads(data)
+                if asyncio.iscoroutinefunction(func):
+                    value = await func(*args, **kwds)
+                else:
+                    call = functools.partial(func, *args, **kwds)
+                    value = await loop.run_in_executor(None, call)
+                outcome = (True, value)
+            except Exception as exc:
+                outcome = (False, exc)
+        outbox.put(_encode(token, func, args, kwds, outcome))
+
+    async def main():
+        tasks = set()
+        while True:
+            job = await loop.run_in_executor(reader, inbox.get)
+            if job is None:
+                break
+            task = loop.create_task(run(*job))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.wait(tasks)
+
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+class HybridEngine(_FutureEngine):
+    """Shards jobs across `processes` worker processes, each running them on
+    its own asyncio event loop
+
+    Concurrency scales with processes times `concurrency` instead of being
+    capped at the number of processes, while parsing and prompt matching are
+    spread over every core. Each job goes to the worker with the fewest jobs
+    in flight and its result comes back as soon as it is done.
+
+    :param processes: (optional) worker processes, defaults to the number of
+                      CPUs
+    :param concurrency: (optional) jobs each worker runs at once
+    """
+
+    # results are pickled on their way back from the workers
+    local = False
+
+    coroutines = True
+
+    def __init__(self, processes=None, concurrency=None):
+        super(HybridEngine, self).__init__()
+
+        processes = processes or mp.cpu_count()
+        concurrency = concurrency or env.ARCOMM_DEFAULT_CONCURRENCY
+        self.slots = processes * concurrency
+
+        self._outbox = mp.Queue()
+        self._inboxes = []
+        self._workers = []
+        for number in range(processes):
+            inbox = mp.Queue()
+            worker = mp.Process(target=_hybrid_main,
+                                args=(inbox, self._outbox, concurrency),
+                                name="arcomm-hybrid-{}".format(number))
+            worker.daemon = True
+            worker.start()
+            self._inboxes.append(inbox)
+            self._workers.append(worker)
+
+        self._tokens = itertools.count()
+
+        # token -> (future, worker number) of jobs in flight
+        self._jobs = {}
+        self._load = [0] * processes
+
+        # numbers of workers found dead, they are sent no more jobs
+        self._lost = set()
+
+        self._stopping = threading.Event()
+        self._reader = threading.Thread(target=self._read,
+                                        name="arcomm-hybrid-results")
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read(self):
+        while not self._stopping.is_set():
+            try:
+                item = self._outbox.get(timeout=.1)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if item is None:
+                # every worker has been joined, jobs still waiting lost theirs
+                self._check_workers()
+                return
+
+            self._finish(*item)
+
+    def _finish(self, token, data):
+        with self._lock:
+            future, number = self._jobs.pop(token)
+            self._load[number] -= 1
+
+        success, value = pickle.loads(data)
+        if not future.set_running_or_notify_cancel():
+            return
+
+        if success:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def _check_workers(self):
+        """Fails the jobs of workers that died, killed or crashed, which
+        would otherwise never finish"""
+
+        with self._lock:
+            dead = [number for number, worker in enumerate(self._workers)
+                    if number not in self._lost and self._load[number] and
+                    not worker.is_alive()]
+        if not dead:
+            return
+
+        # results a worker sent before it died are already in the queue
+        while True:
+            try:
+                item = self._outbox.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._outbox.put(None)
+                break
+            self._finish(*item)
+
+        for number in dead:
+            # nothing reads this inbox anymore, don't wait to flush it
+            self._inboxes[number].cancel_join_thread()
+            error = concurrent.futures.process.BrokenProcessPool(
+                "{} exited with code {}".format(
+                    self._workers[number].name,
+                    self._workers[number].exitcode))
+
+            with self._lock:
+                self._lost.add(number)
+                jobs = [(token, future) for token, (future, owner)
+                        in self._jobs.items() if owner == number]
+                for token, _ in jobs:
+                    del self._jobs[token]
+                self._load[number] = 0
+
+            for _, future in jobs:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(error)
+
+    def apply_async(self, func, args=(), kwds={}, callback=None,
+                    error_callback=None):
+        if self._closed:
+            raise ValueError("Pool not running")
+
+        future = concurrent.futures.Future()
+        token = next(self._tokens)
+        result = self._track(future, callback, error_callback,
+                             cancel=lambda: False)
+
+        # pickled here so a job that can't be sent fails in the caller
+        # rather than in the queue's feeder thread, where it would be lost
+        try:
+            data = pickle.dumps((func, args, kwds), pickle.HIGHEST_PROTOCOL)
+        except Exception as exc:
+            future.set_running_or_notify_cancel()
+            future.set_exception(TypeError(
+                "can't send {} to a worker: {}".format(func, exc)))
+            return result
+
+        with self._lock:
+            alive = [number for number in range(len(self._workers))
+                     if number not in self._lost]
+            if alive:
+                number = min(alive, key=self._load.__getitem__)
+                self._load[number] += 1
+                self._jobs[token] = (future, number)
+
+        if not alive:
+            future.set_running_or_notify_cancel()
+            future.set_exception(concurrent.futures.process.BrokenProcessPool(
+                "all hybrid workers have exited"))
+            return result
+
+        self._inboxes[number].put((token, data))
+
+        # a job sent to a worker always runs, its result is still waited for
+        return result
+
+    def _stop(self, terminated=False):
+        if not self._reader.is_alive():
+            return
+
+        if terminated:
+            # a killed worker may have held the queue's lock, putting to it
+            # could block forever
+            self._stopping.set()
+        else:
+            self._outbox.put(None)
+        self._reader.join()
+
+    def join(self):
+        if not self._closed:
+            raise ValueError("Pool is still running")
+
+        for number, inbox in enumerate(self._inboxes):
+            if number not in self._lost:
+                inbox.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._stop()
+
+    def terminate(self):
+        self._closed = True
+        self._cancel()
+        for worker in self._workers:
+            worker.terminate()
+        self._stop(terminated=True)
+
+def is_local(engine):
+    """True if the engine runs jobs in the caller's process"""
+    return getattr(engine, "local", False)
+
+def slots(engine):
+    """Number of jobs the engine runs at once, None if it can't tell"""
+    # multiprocessing.Pool keeps it in _processes
+    return getattr(engine, "slots", None) or getattr(engine, "_processes",
+                                                     None)
+
+def runs_coroutines(engine):
+    """True if the engine awaits coroutine functions on an event loop instead
+    of calling them"""
+    return getattr(engine, "coroutines", False)
+
+def create_engine(engine=None, processes=None, concurrency=None):
+    """Create an engine by name, see `ENGINES`. `concurrency` is the number
+    of jobs each 'hybrid' worker process runs at once"""
+
+    engine = engine or env.ARCOMM_DEFAULT_ENGINE
+
+    if engine == "process":
+        return mp.Pool(processes)
+    elif engine == "thread":
+        return ThreadEngine(processes)
+    elif engine == "asyncio":
+        return AsyncioEngine(processes)
+    elif engine == "hybrid":
+        return HybridEngine(processes, concurrency)
+
+    raise ValueError("Unknown engine '{}', choose from: {}".format(
+        engine, ", ".join(ENGINES)))
+
+def get_engine(engine=None, processes=None):
+    """Return a long-lived engine shared by every caller asking for the same
+    engine and number of processes. Its workers, and the imports they have
+    done, stay warm between batches until `shutdown_engines` is called or the
+    interpreter exits"""
+
+    key = (engine or env.ARCOMM_DEFAULT_ENGINE, processes)
+
+    with _SHARED_LOCK:
+        if key not in _SHARED:
+            _SHARED[key] = create_engine(*key)
+        return _SHARED[key]
+
+@atexit.register
+def shutdown_engines():
+    """Close all shared engines and wait for their jobs to finish"""
+
+    with _SHARED_LOCK:
+        engines = list(_SHARED.values())
+        _SHARED.clear()
+
+    for engine in engines:
+        engine.close()
+        engine.join()
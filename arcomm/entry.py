@@ -11,7 +11,6 @@ import getpass
 import json
 import re
 import sys
-import yaml
 
 import arcomm
 
@@ -24,8 +23,9 @@ def main():
 
     arg("-v", "--version", action="store_true", help="display version info")
 
-    arg("--protocol", help=("set the protocol. By default 'eapi' is used."),
-        choices=["eapi", "eapi+https", "mock", "ssh"])
+    arg("--protocol", help=("set the protocol. By default 'eapi' is used, "
+                            "'auto' picks the first one that works"),
+        choices=["auto", "eapi", "eapi+https", "mock", "ssh"])
 
     arg("-u", "--username", default="admin",
         help="specifies the username on the switch")
@@ -47,6 +47,42 @@ def main():
 
     arg("--hosts-file", help="path to file containing list of hosts")
 
+    arg("--engine", choices=["process", "thread", "asyncio", "hybrid"],
+        help="how hosts are run in parallel. By default 'process' is used.")
+
+    arg("--ordered", action="store_true",
+        help=("print results in the order hosts were given instead of as "
+              "soon as each host finishes"))
+
+    arg("--max-sessions", type=int,
+        help="maximum number of hosts to run at once")
+
+    arg("--rate", type=float,
+        help="maximum number of new connections per second")
+
+    arg("--adaptive", action="store_true",
+        help=("adjust the number of hosts run at once from their latency, "
+              "up to --max-sessions"))
+
+    arg("--host-timeout", type=float,
+        help="give up on hosts that take longer than this many seconds")
+
+    arg("--deadline", type=float,
+        help="give up on hosts not finished after this many seconds")
+
+    arg("--chunksize", type=int,
+        help="hand hosts to the workers this many at a time")
+
+    arg("--longest-first", action="store_true",
+        help=("start the hosts that took longest last time first, to "
+              "finish the batch sooner"))
+
+    arg("--retries", type=int,
+        help="retry failed connections and commands this many times")
+
+    arg("--spool", help=("write results to this JSON Lines file (gzipped if "
+                         "it ends with .gz) and only print a summary"))
+
     arg("--script", help=("path to a script file containing commands to "
                           "execute. template variables will be processed if "
                           "Jinja2 is installed and `--variables` is also "
@@ -107,6 +143,7 @@ def main():
         username = getpass.getuser()
 
     if args.secret_file:
+        import yaml
         with open(args.secret_file, "r") as stream:
             secrets = yaml.load(stream)
             password = secrets.get(username)
@@ -119,6 +156,38 @@ def main():
     if args.protocol:
         options['protocol'] = args.protocol
 
+    if args.engine:
+        options['engine'] = args.engine
+
+    options['ordered'] = args.ordered
+
+    if args.max_sessions:
+        options['max_sessions'] = args.max_sessions
+
+    if args.adaptive:
+        options['adaptive'] = True
+
+    if args.rate:
+        options['rate'] = args.rate
+
+    if args.host_timeout:
+        options['host_timeout'] = args.host_timeout
+
+    if args.deadline:
+        options['deadline'] = args.deadline
+
+    if args.chunksize:
+        options['chunksize'] = args.chunksize
+
+    if args.longest_first:
+        options['longest_first'] = True
+
+    if args.retries:
+        options['retry'] = args.retries + 1
+
+    if args.spool:
+        options['spool'] = args.spool
+
     options['timeout'] = args.timeout
 
     options['encoding'] = args.encoding
@@ -161,6 +230,9 @@ def main():
         script = script.splitlines()
 
     for res in arcomm.batch(endpoints, script, **options):
+        if args.spool:
+            print('{}: {}'.format(res.host, res.status))
+            continue
         print('---')
         if options['encoding'] == 'json':
             print(res.to_json())
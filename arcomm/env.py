@@ -14,6 +14,12 @@ ARCOMM_DEFAULT_USERNAME = 'admin'
 ARCOMM_DEFAULT_PASSWORD = ''
 ARCOMM_DEFAULT_SUPER = ''
 ARCOMM_DEFAULT_SUPASS = ''
+ARCOMM_DEFAULT_ENGINE = 'process'
+ARCOMM_DEFAULT_CONCURRENCY = 100
+ARCOMM_SESSION_CACHE_SIZE = 64
+ARCOMM_SESSION_IDLE_TIMEOUT = 300
+ARCOMM_RESPONSE_CACHE_SIZE = 1024
+ARCOMM_RESPONSE_CACHE_TTL = 30
 
 if os.name == 'nt':
     ARCOMM_CONF_DIR = os.path.join(os.getenv('APPDATA'), 'arcomm')
@@ -22,3 +28,8 @@ else:
     ARCOMM_CONF_DIR = os.path.expanduser('~/.arcomm')
 
 ARCOMM_SECRETS_FILE = os.path.join(ARCOMM_CONF_DIR, 'secrets.yml')
+ARCOMM_HISTORY_FILE = os.path.join(ARCOMM_CONF_DIR, 'history.json')
+ARCOMM_TRANSPORTS_FILE = os.path.join(ARCOMM_CONF_DIR, 'transports.json')
+
+# tried in this order by the 'auto' protocol
+ARCOMM_AUTO_PROTOCOLS = ('eapi+https', 'eapi+http', 'ssh')
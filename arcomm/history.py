@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Remember how long each host took to run a set of commands, so the slowest
+hosts can be started first next time"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from arcomm import env
+from arcomm.util import parse_endpoint, to_list
+
+def _commands_key(commands):
+    text = "\n".join(str(command) for command in to_list(commands))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+class History(object):
+    """Moving average of past durations by host and set of commands, kept in
+    a small JSON file
+
+    :param path: (optional) file to keep the history in, defaults to
+                 `ARCOMM_HISTORY_FILE`. None keeps it in memory only
+    :param maxsize: (optional) entries kept, the least recently updated are
+                    dropped first
+    :param weight: (optional) weight of the newest duration in the average
+    """
+
+    def __init__(self, path=env.ARCOMM_HISTORY_FILE, maxsize=10000,
+                 weight=.5):
+        self.path = path
+        self.maxsize = maxsize
+        self.weight = weight
+
+        # key -> [average duration, last updated]
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, endpoint, commands):
+        hostname = parse_endpoint(str(endpoint))["hostname"]
+        return "{} {}".format(hostname, _commands_key(commands))
+
+    def expected(self, endpoint, commands):
+        """Seconds the host is expected to take, None if it was never seen"""
+        entry = self._entries.get(self._key(endpoint, commands))
+        return entry[0] if entry else None
+
+    def record(self, endpoint, commands, duration):
+        key = self._key(endpoint, commands)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                duration = (self.weight * duration +
+                            (1 - self.weight) * entry[0])
+            self._entries[key] = [duration, time.time()]
+
+    def load(self):
+        with open(self.path) as fh:
+            entries = json.load(fh)
+
+        with self._lock:
+            self._entries.update(entries)
+
+    def save(self):
+        """Write the history, atomically replacing the old file"""
+
+        if not self.path:
+            return
+
+        with self._lock:
+            entries = sorted(self._entries.items(),
+                             key=lambda item: item[1][1])
+            entries = dict(entries[-self.maxsize:])
+            self._entries = entries
+
+        directory = os.path.dirname(self.path) or "."
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        fd, path = tempfile.mkstemp(dir=directory, prefix=".history-")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(entries, fh)
+        os.replace(path, self.path)
+
+def longest_first_order(endpoints, commands, history, priorities=None):
+    """Order in which to start the hosts, as indexes into `endpoints`
+
+    Higher priorities go first, then the hosts expected to take longest.
+    Hosts without history are assumed to take the average time.
+    """
+
+    priorities = priorities or [0] * len(endpoints)
+
+    expected = [history.expected(endpoint, commands) for endpoint in endpoints]
+    known = [duration for duration in expected if duration is not None]
+    default = sum(known) / len(known) if known else 0
+
+    def sort_key(index):
+        duration = expected[index]
+        if duration is None:
+            duration = default
+        return (-(priorities[index] or 0), -duration, index)
+
+    return sorted(range(len(endpoints)), key=sort_key)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Overlap session setup with command execution by running connect, execute
+and post-process as separate stages"""
+
+import importlib
+import queue
+import threading
+import time
+
+import arcomm
+from arcomm.util import to_list
+
+_async = importlib.import_module("arcomm.async")
+_exception_store = _async._exception_store
+
+# tells a stage's workers there is nothing more to do
+_DONE = object()
+
+class _Stage(object):
+    """Pool of threads taking items from `inbox`, passing them through func
+    and putting the results in `outbox`. If func raises, what `error`
+    returns for the item is put instead. The last worker to finish passes on
+    one `_DONE` for each worker of the next stage"""
+
+    def __init__(self, name, func, workers, inbox, outbox, next_workers=1,
+                 error=None):
+        self._func = func
+        self._error = error
+        self._inbox = inbox
+        self._outbox = outbox
+        self._next_workers = next_workers
+        self._running = workers
+        self._lock = threading.Lock()
+
+        self._threads = [threading.Thread(target=self._run,
+                                          name="arcomm-{}".format(name))
+                         for _ in range(workers)]
+        for thread in self._threads:
+            thread.daemon = True
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                item = self._inbox.get()
+                if item is _DONE:
+                    break
+                try:
+                    result = self._func(item)
+                except Exception:
+                    result = self._error(item)
+                self._outbox.put(result)
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+
+            if last:
+                for _ in range(self._next_workers):
+                    self._outbox.put(_DONE)
+
+class Pipeline(object):
+    """Runs hosts through three stages, each with its own threads: connect
+    and log in, execute the commands, then post-process the result
+
+    Connected sessions wait in a bounded queue for an execute slot, so slow
+    handshakes never hold up hosts that are ready to run commands. A host
+    reserves its place in the queue before connecting, so no more than
+    `queue_size` idle sessions are kept open at once. Stages run as
+    threads in the calling process, sessions can't be handed between
+    processes.
+
+    :param connectors: (optional) hosts connecting at once
+    :param executors: (optional) hosts running commands at once
+    :param processors: (optional) threads running `postprocess`
+    :param queue_size: (optional) connected sessions allowed to wait for an
+                       execute slot, defaults to `executors`
+    :param postprocess: (optional) called with each `ResponseStore`, its
+                        return value is yielded instead
+    :param ordered: (optional) yield results in the order hosts were given
+                    instead of as soon as each one is done
+
+    Other keyword arguments are session parameters, as for `Pool`. Failed
+    hosts are yielded as error responses.
+    """
+
+    def __init__(self, endpoints, commands, connectors=16, executors=8,
+                 processors=1, queue_size=None, postprocess=None,
+                 ordered=False, **kwargs):
+
+        self._endpoints = to_list(endpoints)
+        self._commands = commands
+        self._postprocess = postprocess
+        self._ordered = ordered
+        self._params = kwargs
+
+        self._todo = queue.Queue()
+        self._connected = queue.Queue(queue_size or executors)
+        self._executed = queue.Queue(queue_size or executors)
+        self._done = queue.Queue()
+
+        # places in `_connected`, taken before connecting and given back when
+        # an executor picks the host up
+        self._slots = threading.Semaphore(queue_size or executors)
+
+        self._stages = [
+            _Stage("connect", self._connect, connectors, self._todo,
+                   self._connected, executors, error=self._connect_failed),
+            _Stage("execute", self._execute, executors, self._connected,
+                   self._executed, processors, error=self._execute_failed),
+            _Stage("postprocess", self._process, processors, self._executed,
+                   self._done, error=self._process_failed)
+        ]
+
+        for index, endpoint in enumerate(self._endpoints):
+            params = {}
+            if isinstance(endpoint, (tuple, list)):
+                endpoint, params = endpoint
+            self._todo.put((index, endpoint, params))
+
+        for _ in range(connectors):
+            self._todo.put(_DONE)
+
+        self._started = False
+
+    def __iter__(self):
+        if not self._started:
+            self.start()
+
+        if not self._ordered:
+            for _, result in self._results():
+                yield result
+            return
+
+        waiting = {}
+        wanted = 0
+        for index, result in self._results():
+            waiting[index] = result
+            while wanted in waiting:
+                yield waiting.pop(wanted)
+                wanted += 1
+
+    def _results(self):
+        while True:
+            item = self._done.get()
+            if item is _DONE:
+                return
+            yield item
+
+    def start(self):
+        self._started = True
+        for stage in self._stages:
+            stage.start()
+
+    def _connect(self, item):
+        self._slots.acquire()
+        index, endpoint, params = item
+        params = dict(self._params, **params)
+
+        started = time.time()
+        session = arcomm.Session(endpoint,
+                                 creds=params.pop("creds", None),
+                                 protocol=params.pop("protocol", None),
+                                 authorize=params.pop("authorize", None),
+                                 retry=params.pop("retry", None))
+        try:
+            session.connect()
+        except Exception:
+            store = _exception_store(endpoint, hostname=session.hostname)
+            return (index, None, store)
+
+        connected = time.time()
+        timings = {"connect": connected - started}
+        return (index, session, (params, timings, connected))
+
+    def _connect_failed(self, item):
+        # the endpoint may be what failed, keep it as given
+        index, endpoint, _ = item
+        store = _exception_store(endpoint, hostname=str(endpoint))
+        return (index, None, store)
+
+    def _execute(self, item):
+        self._slots.release()
+        index, session, value = item
+        if session is None:
+            # failed to connect, value is the error response
+            return (index, value)
+
+        params, timings, connected = value
+        started = time.time()
+        timings["queued"] = started - connected
+        try:
+            result = session.execute(self._commands, **params)
+            timings["execute"] = time.time() - started
+            result.metadata["timings"] = timings
+        except Exception:
+            result = _exception_store(session.endpoint,
+                                      hostname=session.hostname)
+        finally:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+        return (index, result)
+
+    def _execute_failed(self, item):
+        index, session, _ = item
+        return (index, _exception_store(session.endpoint,
+                                        hostname=session.hostname))
+
+    def _process(self, item):
+        index, result = item
+        if self._postprocess:
+            result = self._postprocess(result)
+        return (index, result)
+
+    def _process_failed(self, item):
+        index, result = item
+        return (index, _exception_store(result.host, hostname=result.host))
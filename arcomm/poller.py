@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Poll a fleet until every host's output meets a condition"""
+
+import collections
+import concurrent.futures
+import heapq
+import importlib
+import queue
+import re
+import threading
+import time
+
+import arcomm
+from arcomm.util import to_list
+
+_async = importlib.import_module("arcomm.async")
+_error_store = _async._error_store
+
+# tells the iterator all hosts have been reported
+_DONE = object()
+
+def mkcondition(condition, exclude=False):
+    """Turn a pattern, compiled or not, or a callable taking a
+    `ResponseStore` into a test on the store, compiled only once"""
+
+    if callable(condition) and not hasattr(condition, "search"):
+        test = condition
+    else:
+        regex = re.compile(condition)
+        test = lambda response: bool(regex.search(str(response)))
+
+    if exclude:
+        return lambda response: not test(response)
+    return test
+
+class Poller(object):
+    """Runs commands on each host until its output meets `condition`
+
+    One scheduler thread keeps every host's next poll time in a heap and
+    hands polls that are due to at most `workers` threads, so waiting on a
+    large fleet doesn't tie up a thread or process per host. Sessions stay
+    connected between polls and are reconnected after failures, which count
+    as not converged, e.g. while a host reloads.
+
+    :param condition: regular expression searched for in the output, or a
+                      callable taking the `ResponseStore` and returning True
+                      once the host is done
+    :param exclude: (optional) done when the condition stops matching
+    :param interval: (optional) seconds between polls of a host
+    :param backoff: (optional) the interval is multiplied by this after each
+                    poll that didn't converge
+    :param max_interval: (optional) never wait longer than this between polls
+    :param deadline: (optional) seconds the whole fleet may take, hosts not
+                     done by then are reported as 'timedout'
+    :param workers: (optional) polls running at once
+    :param callback: (optional) called with each host's `ResponseStore` as
+                     soon as it converges
+
+    Other keyword arguments are session parameters, as for `Pool`. Iterating
+    yields the converged responses as they come in, then a 'timedout'
+    response for each host that didn't make it.
+    """
+
+    def __init__(self, endpoints, commands, condition, exclude=False,
+                 interval=5, backoff=1, max_interval=60, deadline=None,
+                 workers=32, callback=None, **kwargs):
+
+        self._commands = commands
+        self._test = mkcondition(condition, exclude)
+        self._interval = interval
+        self._backoff = backoff
+        self._max_interval = max_interval
+        self._deadline = deadline
+        self._workers = workers
+        self._callback = callback
+        self._params = kwargs
+
+        self._endpoints = []
+        self._sessions = []
+        for endpoint in to_list(endpoints):
+            params = {}
+            if isinstance(endpoint, (tuple, list)):
+                endpoint, params = endpoint
+            self._endpoints.append((endpoint, dict(self._params, **params)))
+            self._sessions.append(endpoint if isinstance(
+                endpoint, arcomm.Session) else None)
+
+        self._hosts = [self._host(index) for index in range(len(self))]
+
+        # (next poll, index) of hosts waiting for their next poll
+        self._timers = [(0, index) for index in range(len(self))]
+
+        self._running = 0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._stopped = False
+
+        self.polls = [0] * len(self)
+        self.errors = {}
+
+        # host -> seconds it took to converge, in the order hosts converged
+        self.converged = collections.OrderedDict()
+
+        self._results = queue.Queue()
+        self._executor = None
+        self._thread = None
+        self._finished = threading.Event()
+        self._started_at = None
+
+    def __len__(self):
+        return len(self._endpoints)
+
+    def __iter__(self):
+        if self._thread is None:
+            self.start()
+
+        while True:
+            item = self._results.get()
+            if item is _DONE:
+                return
+            yield item
+
+    def _host(self, index):
+        endpoint, _ = self._endpoints[index]
+        if isinstance(endpoint, arcomm.Session):
+            return endpoint.hostname
+        return arcomm.util.parse_endpoint(str(endpoint))["hostname"]
+
+    @property
+    def pending(self):
+        """Hosts that haven't converged (yet)"""
+        return [host for host in self._hosts if host not in self.converged]
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def summary(self):
+        return {
+            "converged": dict(self.converged),
+            "pending": self.pending,
+            "polls": dict(zip(self._hosts, self.polls)),
+            "errors": dict(self.errors)
+        }
+
+    def start(self):
+        self._started_at = time.time()
+        self._executor = concurrent.futures.ThreadPoolExecutor(self._workers)
+        self._thread = threading.Thread(target=self._schedule,
+                                        name="arcomm-poller")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def join(self, timeout=None):
+        """Wait until every host converged or the deadline passed, returns
+        False if `timeout` ran out first"""
+        if self._thread is None:
+            self.start()
+        return self._finished.wait(timeout)
+
+    def run(self):
+        """Poll until done, returns `summary`"""
+        self.join()
+        return self.summary()
+
+    def stop(self):
+        """Stop polling, hosts not converged are reported as 'timedout'"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _delay(self, index):
+        delay = self._interval * self._backoff ** (self.polls[index] - 1)
+        return min(self._max_interval, delay)
+
+    def _schedule(self):
+        deadline = None
+        if self._deadline:
+            deadline = self._started_at + self._deadline
+
+        with self._cond:
+            while not self._stopped and (self._timers or self._running):
+                now = time.time()
+                if deadline and now >= deadline:
+                    break
+
+                if (self._timers and self._timers[0][0] <= now and
+                        self._running < self._workers):
+                    _, index = heapq.heappop(self._timers)
+                    self._running += 1
+                    self._executor.submit(self._poll, index)
+                    continue
+
+                wait = deadline - now if deadline else None
+                if self._timers and self._running < self._workers:
+                    wait = min(wait or self._max_interval,
+                               self._timers[0][0] - now)
+                self._cond.wait(wait)
+
+            self._stopped = True
+
+        self._finish()
+
+    def _finish(self):
+        for index, host in enumerate(self._hosts):
+            if host not in self.converged:
+                self._results.put(_error_store(
+                    host, "!timeout",
+                    "[Timeout] condition not met after {} polls".format(
+                        self.polls[index]), status="timedout"))
+
+        self._results.put(_DONE)
+        self._finished.set()
+
+        # wait for polls still running before closing the sessions
+        self._executor.shutdown(wait=True)
+        for index, session in enumerate(self._sessions):
+            endpoint, _ = self._endpoints[index]
+            if session is not None and session is not endpoint:
+                self._close(index)
+
+    def _close(self, index):
+        try:
+            self._sessions[index].close()
+        except Exception:
+            pass
+        self._sessions[index] = None
+
+    def _session(self, index):
+        session = self._sessions[index]
+        if session is None:
+            endpoint, params = self._endpoints[index]
+            session = arcomm.Session(endpoint,
+                                     creds=params.get("creds"),
+                                     protocol=params.get("protocol"),
+                                     retry=params.get("retry"))
+            self._sessions[index] = session
+
+        if not session.connected:
+            session.connect()
+        return session
+
+    def _poll(self, index):
+        _, params = self._endpoints[index]
+        params = dict((key, value) for key, value in params.items()
+                      if key not in ("creds", "protocol", "retry"))
+
+        response = None
+        try:
+            response = self._session(index).execute(self._commands, **params)
+            converged = self._test(response)
+        except Exception as exc:
+            self.errors[self._hosts[index]] = "[{}] {}".format(
+                exc.__class__.__name__, exc)
+            converged = False
+            endpoint, _ = self._endpoints[index]
+            if self._sessions[index] is not endpoint:
+                self._close(index)
+
+        with self._cond:
+            self._running -= 1
+            self.polls[index] += 1
+
+            if self._stopped:
+                # the deadline passed while polling, too late to count
+                self._cond.notify_all()
+                return
+
+            if converged:
+                host = self._hosts[index]
+                self.errors.pop(host, None)
+                self.converged[host] = time.time() - self._started_at
+                response.metadata["converged"] = self.converged[host]
+                response.metadata["polls"] = self.polls[index]
+            else:
+                heapq.heappush(self._timers,
+                               (time.time() + self._delay(index), index))
+            self._cond.notify_all()
+
+        if converged:
+            self._results.put(response)
+            if self._callback:
+                self._callback(response)
@@ -3,4 +3,6 @@
 # Copyright (c) 2016 Arista Networks, Inc.  All rights reserved.
 # Arista Networks, Inc. Confidential and Proprietary.
 
-from arcomm.protocols.protocol import BaseProtocol
+from arcomm.protocols.protocol import AsyncBaseProtocol, BaseProtocol
+from arcomm.protocols.adapters import (available, get_adapter, preload,
+                                       register_adapter)
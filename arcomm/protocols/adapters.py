@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Registry of protocol adapters, resolved once per process
+
+Third-party packages can add adapters by declaring an entry point in the
+``arcomm.protocols`` group, e.g. in their setup.py::
+
+    entry_points={"arcomm.protocols": ["junos = myproject.junos:Junos"]}
+
+or at runtime with `register_adapter`.
+"""
+
+import importlib
+import re
+import threading
+
+from arcomm.exceptions import ProtocolException
+
+ENTRY_POINT_GROUP = "arcomm.protocols"
+
+# name -> adapter class, or a "module:Class" string not imported yet
+_ADAPTERS = {
+    "auto": "arcomm.protocols.auto:Auto",
+    "eapi": "arcomm.protocols.eapi:Eapi",
+    "mock": "arcomm.protocols.mock:Mock",
+    "ssh": "arcomm.protocols.ssh:Ssh",
+    "xmpp": "arcomm.protocols.xmpp:Xmpp",
+    "async_eapi": "arcomm.protocols.async_eapi:AsyncEapi",
+    "async_mock": "arcomm.protocols.async_mock:AsyncMock",
+    "async_ssh": "arcomm.protocols.async_ssh:AsyncSsh"
+}
+_LOCK = threading.Lock()
+_discovered = False
+
+def register_adapter(name, adapter):
+    """Use adapter, a class or a "module:Class" string imported when first
+    needed, for the protocol name. Replaces any adapter of that name"""
+
+    with _LOCK:
+        _ADAPTERS[name] = adapter
+
+def _entry_points():
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            from pkg_resources import iter_entry_points
+        except ImportError:
+            return []
+        return list(iter_entry_points(ENTRY_POINT_GROUP))
+
+    found = entry_points()
+    if hasattr(found, "select"):
+        return list(found.select(group=ENTRY_POINT_GROUP))
+    return list(found.get(ENTRY_POINT_GROUP, []))
+
+def discover():
+    """Add adapters declared by installed packages. Done once, the first
+    time an unknown protocol is asked for. Adapters already registered are
+    kept"""
+
+    global _discovered
+
+    with _LOCK:
+        if _discovered:
+            return
+        for entry_point in _entry_points():
+            _ADAPTERS.setdefault(entry_point.name, entry_point)
+        _discovered = True
+
+def _resolve(adapter):
+    if isinstance(adapter, str):
+        module, _, name = adapter.partition(":")
+        return getattr(importlib.import_module(module), name)
+    elif not isinstance(adapter, type) and hasattr(adapter, "load"):
+        # an entry point
+        return adapter.load()
+    return adapter
+
+def _by_convention(name):
+    """Adapter found the old way, a module of that name in this package with
+    a class named after it"""
+
+    module = importlib.import_module("arcomm.protocols." + name)
+    return getattr(module, re.sub(r"_", "", name.title()))
+
+def get_adapter(name):
+    """Return the adapter class for a protocol name"""
+
+    adapter = _ADAPTERS.get(name)
+    if isinstance(adapter, type):
+        return adapter
+
+    if adapter is None:
+        discover()
+        adapter = _ADAPTERS.get(name)
+
+    if adapter is None:
+        try:
+            adapter = _by_convention(name)
+        except ImportError as exc:
+            if exc.name != "arcomm.protocols." + name:
+                raise
+            raise ProtocolException(
+                "Unknown protocol '{}', choose from: {}".format(
+                    name, ", ".join(available())))
+    else:
+        adapter = _resolve(adapter)
+
+    with _LOCK:
+        _ADAPTERS[name] = adapter
+    return adapter
+
+def available():
+    """Names of all known protocols"""
+    discover()
+    return sorted(_ADAPTERS)
+
+def preload(names=None):
+    """Import adapters ahead of time, e.g. before forking workers, so no
+    session pays for it. Adapters whose dependencies are missing are
+    skipped"""
+
+    for name in names or available():
+        try:
+            get_adapter(name)
+        except Exception:
+            pass
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Async eAPI adapter module. Speaks JSON-RPC over a keep-alive HTTP(S)
+connection using asyncio streams, so no extra packages are needed"""
+
+import asyncio
+import base64
+import itertools
+import json
+import ssl
+
+from arcomm import env
+from arcomm.command import Command
+from arcomm.exceptions import AuthenticationFailed, ConnectFailed, ExecuteFailed
+from arcomm.protocols.protocol import AsyncBaseProtocol
+from arcomm.util import prepare_commands, to_list, zipnpad
+
+class AsyncEapi(AsyncBaseProtocol):
+    """eAPI over one persistent connection, requests on it are sent one at a
+    time. Credentials are checked by the first command sent"""
+
+    def __init__(self):
+        self._host = None
+        self._port = None
+        self._ssl = None
+        self._headers = {}
+        self._timeout = env.ARCOMM_DEFAULT_TIMEOUT
+        self._authorize = None
+
+        self._reader = None
+        self._writer = None
+        self._lock = None
+        self._ids = itertools.count(1)
+
+    def alive(self):
+        return (self._writer is not None and
+                not self._writer.transport.is_closing())
+
+    async def connect(self, host, **kwargs):
+        transport = kwargs.get("transport") or "http"
+
+        if transport == "https":
+            self._ssl = ssl.create_default_context()
+            if not kwargs.get("verify", True):
+                self._ssl.check_hostname = False
+                self._ssl.verify_mode = ssl.CERT_NONE
+            if "cert" in kwargs:
+                self._ssl.load_cert_chain(*to_list(kwargs["cert"]))
+
+        self._host = host
+        self._port = kwargs.get("port") or (443 if self._ssl else 80)
+        self._timeout = kwargs.get("timeout") or self._timeout
+
+        self._headers = {
+            "Host": host,
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        }
+
+        creds = kwargs.get("creds")
+        if creds and "cert" not in kwargs:
+            token = "{}:{}".format(*creds.auth).encode("utf-8")
+            self._headers["Authorization"] = "Basic {}".format(
+                base64.b64encode(token).decode("ascii"))
+
+        self._lock = asyncio.Lock()
+        await self._open()
+
+    async def _open(self):
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port, ssl=self._ssl),
+                self._timeout)
+        except (OSError, asyncio.TimeoutError) as exc:
+            raise ConnectFailed("Connection to {} failed: {}".format(
+                self._host, exc or "timed out"))
+
+    def _drop(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def close(self):
+        self._drop()
+
+    async def _read_response(self):
+        status = await self._reader.readline()
+        if not status:
+            raise ConnectionResetError("connection closed by peer")
+
+        # the reason phrase is optional, e.g. "HTTP/1.1 200"
+        parts = status.decode("latin-1").rstrip().split(" ", 2)
+        _, code, reason = (parts + [""])[:3]
+
+        headers = {}
+        while True:
+            line = (await self._reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readline()
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await self._reader.readexactly(
+                int(headers["content-length"]))
+        else:
+            body = await self._reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close":
+            self._drop()
+
+        return int(code), reason, body
+
+    async def _request(self, payload, timeout):
+        body = json.dumps(payload).encode("utf-8")
+        headers = dict(self._headers, **{"Content-Length": str(len(body))})
+        head = "POST /command-api HTTP/1.1\r\n"
+        head += "".join("{}: {}\r\n".format(*item) for item in headers.items())
+        request = (head + "\r\n").encode("latin-1") + body
+
+        async with self._lock:
+            for attempt in range(2):
+                if not self.alive():
+                    await self._open()
+                try:
+                    self._writer.write(request)
+                    return await asyncio.wait_for(self._read_response(),
+                                                  timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    # the switch closed an idle keep-alive connection
+                    self._drop()
+                    if attempt:
+                        raise
+                except asyncio.TimeoutError:
+                    self._drop()
+                    raise
+
+    async def send(self, commands, **kwargs):
+        results = []
+
+        encoding = kwargs.get("encoding", kwargs.get("format", "text"))
+        timestamps = kwargs.get("timestamps", False)
+        timeout = kwargs.get("timeout") or self._timeout
+
+        if self._authorize:
+            commands = [self._authorize] + commands
+
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "runCmds",
+            "params": {
+                "version": 1,
+                "cmds": prepare_commands(commands),
+                "format": encoding,
+                "timestamps": timestamps
+            },
+            "id": next(self._ids)
+        }
+
+        try:
+            code, reason, body = await self._request(payload, timeout)
+        except asyncio.TimeoutError:
+            raise ExecuteFailed("Timed out after {} seconds".format(timeout))
+        except (ConnectionError, asyncio.IncompleteReadError) as exc:
+            raise ExecuteFailed(str(exc))
+
+        if code == 401:
+            raise AuthenticationFailed("{} {}".format(code, reason))
+        elif code != 200:
+            raise ExecuteFailed("{} {}".format(code, reason))
+
+        response = json.loads(body.decode("utf-8"))
+
+        status_code = 0
+        status_message = None
+
+        if "error" in response:
+            error = response["error"]
+            status_code = error.get("code", 1)
+            status_message = error.get("message")
+            data = error.get("data") or []
+        else:
+            data = response.get("result") or []
+
+        for command, result in zipnpad(commands, data):
+            errored = True
+            output = None
+
+            if result:
+                errored = "errors" in result
+                if encoding == "text":
+                    output = result.get("output", "")
+                else:
+                    output = result
+
+            results.append([command, output, errored])
+
+        if len(results) > 1 and self._authorize:
+            results.pop(0)
+
+        return (results, status_code, status_message)
+
+    async def authorize(self, password, username=None):
+        self._authorize = Command({"cmd": "enable", "input": password})
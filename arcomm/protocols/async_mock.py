@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Async mock adapter module, answers the same way as the mock adapter but
+waits without blocking the event loop"""
+
+import asyncio
+
+from arcomm.protocols import mock
+from arcomm.protocols.protocol import AsyncBaseProtocol
+
+class AsyncMock(AsyncBaseProtocol):
+    """Async version of :class:`arcomm.protocols.mock.Mock`"""
+
+    def __init__(self):
+        self._host = None
+        self._authorized = False
+
+    async def close(self):
+        self._host = None
+
+    def alive(self):
+        return self._host is not None
+
+    async def connect(self, host, **kwargs):
+        if mock.CONNECT_DELAY:
+            await asyncio.sleep(mock.CONNECT_DELAY)
+
+        mock.check_host(host)
+
+        self._host = host
+
+    async def stream(self, commands, **kwargs):
+        latency = kwargs.get("latency")
+        if latency:
+            await asyncio.sleep(latency)
+
+        for command in commands:
+            delay, output, errored = mock.answer(self._host, command)
+            if delay:
+                await asyncio.sleep(delay)
+            yield [command, output, errored]
+
+    async def send(self, commands, **kwargs):
+        results = []
+        async for result in self.stream(commands, **kwargs):
+            results.append(result)
+
+        status_code = 1 if any(result[2] for result in results) else 0
+        return (results, status_code, "")
+
+    async def authorize(self, password, username=None):
+        self._authorized = True
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Async SSH adapter module"""
+
+import asyncio
+
+from arcomm.protocols.protocol import AsyncBaseProtocol
+from arcomm.protocols.shell import Shell
+from arcomm.exceptions import ConnectFailed, ExecuteFailed, \
+                              AuthenticationFailed,  AuthorizationFailed, \
+                              ProtocolException
+from arcomm.command import Command
+
+try:
+    import asyncssh
+except ImportError:
+    raise ProtocolException("asyncssh is required for async SSH connections")
+
+class AsyncSsh(Shell, AsyncBaseProtocol):
+    """Async version of :class:`arcomm.protocols.ssh.Ssh`"""
+
+    def __init__(self):
+        super(AsyncSsh, self).__init__()
+
+        self._port = 22
+        self._timeout = 30
+
+        self._banner = None
+        self._conn = None
+        self._process = None
+
+    async def authorize(self, password, username=None):
+        """Authorize the session"""
+        command = Command('enable', prompt=self._password_re, answer=password)
+
+        try:
+            await self._send(command)
+        except ExecuteFailed as exc:
+            raise AuthorizationFailed(str(exc))
+
+    async def close(self):
+        """close the session"""
+        if self._conn:
+            self._conn.close()
+        self._conn = self._process = None
+
+    def alive(self):
+        """check the connection and shell are still open"""
+        return bool(self._process and not self._process.stdout.at_eof())
+
+    async def connect(self, host, creds, **kwargs):
+        """Connect to a host and start the shell"""
+
+        timeout = kwargs.get('timeout')
+        if timeout:
+            self._timeout = timeout
+
+        port = kwargs.get('port') or self._port
+
+        try:
+            self._conn = await asyncio.wait_for(
+                asyncssh.connect(host, port, username=creds.username,
+                                 password=creds.password, known_hosts=None,
+                                 client_keys=None),
+                self._timeout)
+        except asyncssh.PermissionDenied as exc:
+            raise AuthenticationFailed(str(exc))
+        except (asyncio.TimeoutError, asyncssh.Error, OSError) as exc:
+            raise ConnectFailed(str(exc) or "Timed out")
+
+        # a shell is needed so session commands like 'enable' stick
+        self._process = await self._conn.create_process(term_type='vt100')
+
+        # capture login banner and clear any login messages
+        self._banner = await self._send(Command('\r'))
+
+        # don't die if these commands aren't available
+        try:
+            await self.send([Command('terminal length 0'),
+                             Command('terminal dont-ask')])
+        except ExecuteFailed:
+            pass
+
+    async def stream(self, commands, **kwargs):
+        """Yield each command's response as soon as its prompt comes back,
+        stops after the first error"""
+
+        timeout = kwargs.get('timeout') or self._timeout
+
+        for command in commands:
+            try:
+                response = await asyncio.wait_for(self._send(command), timeout)
+            except asyncio.TimeoutError:
+                message = "% Timed out while running: {}".format(command)
+                yield [command, message, True]
+                return
+            except ExecuteFailed as exc:
+                yield [command, str(exc), True]
+                return
+
+            yield [command, response, False]
+
+    async def send(self, commands, **kwargs):
+        """Send a series of commands to the device"""
+        responses = []
+        status_code = 0
+
+        async for response in self.stream(commands, **kwargs):
+            if response[2]:
+                status_code = 1
+            responses.append(response)
+
+        # commands after a failure are not run
+        for command in commands[len(responses):]:
+            responses.append([command, None, None])
+
+        return responses, status_code, ""
+
+    async def _send(self, command):
+        """Sends a command and reads until the prompt comes back"""
+
+        buff = []
+        errored_response = None
+
+        self._process.stdin.write(str(command) + '\r')
+
+        while True:
+            response = await self._process.stdout.read(1024)
+            if not response:
+                raise ExecuteFailed("Connection closed while running: {}"
+                                    .format(command))
+
+            buff.append(response)
+            window = "".join(buff)[-150:]
+
+            if self._handle_errors(window):
+                errored_response = "".join(buff)
+
+            # deal with interactive input
+            for _answer in self._answers(window, command.prompt,
+                                         command.answer):
+                self._process.stdin.write(_answer + '\r')
+
+            if self._handle_prompt(window):
+                data = self._clean_response(command, "".join(buff))
+                if errored_response:
+                    raise ExecuteFailed(errored_response)
+                return data
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Auto adapter module. Tries protocols in turn and remembers, per host,
+which ones worked and how fast they connected"""
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+from arcomm import env
+from arcomm.exceptions import AuthenticationFailed, ConnectFailed, \
+                              ProtocolException
+from arcomm.protocols.adapters import get_adapter
+from arcomm.protocols.protocol import BaseProtocol
+
+# process-wide memo, see `get_memo`
+_MEMO = None
+_MEMO_LOCK = threading.Lock()
+
+class TransportMemo(object):
+    """Protocols that worked or failed for each host, kept in a small JSON
+    file so the next run tries the right one first
+
+    :param path: (optional) file to keep the memo in, defaults to
+                 `ARCOMM_TRANSPORTS_FILE`. None keeps it in memory only
+    :param maxsize: (optional) hosts kept, the least recently updated are
+                    dropped first
+    :param weight: (optional) weight of the newest connect time in the
+                   average
+    """
+
+    def __init__(self, path=env.ARCOMM_TRANSPORTS_FILE, maxsize=10000,
+                 weight=.5):
+        self.path = path
+        self.maxsize = maxsize
+        self.weight = weight
+
+        # host -> {"connect": {protocol: seconds}, "failed": [protocol],
+        #          "updated": time}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, host):
+        return self._entries.get(host)
+
+    def order(self, host, protocols):
+        """Protocols to try for host: those that worked, fastest first, then
+        untried ones in the given order and known failures last"""
+
+        entry = self._entries.get(host)
+        if not entry:
+            return list(protocols)
+
+        connect = entry["connect"]
+        failed = entry["failed"]
+        worked = sorted((protocol for protocol in protocols
+                         if protocol in connect), key=connect.get)
+        untried = [protocol for protocol in protocols
+                   if protocol not in connect and protocol not in failed]
+        return worked + untried + [protocol for protocol in protocols
+                                   if protocol in failed]
+
+    def _entry(self, host):
+        entry = self._entries.setdefault(host, {"connect": {}, "failed": []})
+        entry["updated"] = time.time()
+        return entry
+
+    def record(self, host, protocol, seconds):
+        """Remember that protocol connected to host in `seconds`, returns True
+        if it wasn't known to work before"""
+
+        with self._lock:
+            entry = self._entry(host)
+            previous = entry["connect"].get(protocol)
+            if previous is not None:
+                seconds = self.weight * seconds + (1 - self.weight) * previous
+            entry["connect"][protocol] = seconds
+            if protocol in entry["failed"]:
+                entry["failed"].remove(protocol)
+            return previous is None
+
+    def failed(self, host, protocol):
+        """Remember that protocol couldn't connect to host, returns True if
+        it wasn't known to fail before"""
+
+        with self._lock:
+            entry = self._entry(host)
+            entry["connect"].pop(protocol, None)
+            if protocol in entry["failed"]:
+                return False
+            entry["failed"].append(protocol)
+            return True
+
+    def forget(self, host=None):
+        """Drop what is known about the host, or all hosts"""
+        with self._lock:
+            if host is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(host, None)
+
+    def load(self):
+        with open(self.path) as fh:
+            entries = json.load(fh)
+
+        with self._lock:
+            for host, entry in entries.items():
+                current = self._entries.get(host)
+                if not current or current["updated"] < entry["updated"]:
+                    self._entries[host] = entry
+
+    def save(self):
+        """Write the memo, atomically replacing the old file. Newer entries
+        written by other processes meanwhile are kept"""
+
+        if not self.path:
+            return
+
+        if os.path.exists(self.path):
+            try:
+                self.load()
+            except ValueError:
+                pass
+
+        with self._lock:
+            entries = sorted(self._entries.items(),
+                             key=lambda item: item[1]["updated"])
+            entries = dict(entries[-self.maxsize:])
+            self._entries = entries
+
+        directory = os.path.dirname(self.path) or "."
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        fd, path = tempfile.mkstemp(dir=directory, prefix=".transports-")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(entries, fh)
+        os.replace(path, self.path)
+
+def get_memo():
+    """The memo shared by every 'auto' session in this process"""
+
+    global _MEMO
+
+    with _MEMO_LOCK:
+        if _MEMO is None:
+            _MEMO = TransportMemo()
+        return _MEMO
+
+@atexit.register
+def _save_memo():
+    if _MEMO is not None:
+        try:
+            _MEMO.save()
+        except (IOError, OSError):
+            pass
+
+class Auto(BaseProtocol):
+    """Connects with the first protocol that works
+
+    Session parameters:
+
+        protocols       protocols to try, defaults to
+                        `ARCOMM_AUTO_PROTOCOLS`
+        transport_memo  `TransportMemo` to use, defaults to `get_memo`
+
+    Protocols that worked for the host before are tried first, fastest
+    first. Authentication failures are not retried with another protocol.
+    The memo file is written when what works for a host changes, updated
+    connect times are written at exit.
+    """
+
+    def __init__(self):
+        self._conn = None
+
+        # protocol that connected, e.g. 'eapi+https'
+        self.protocol = None
+
+    def connect(self, host, **kwargs):
+        memo = kwargs.pop("transport_memo", None)
+        if memo is None:
+            memo = get_memo()
+        protocols = kwargs.pop("protocols", None) or env.ARCOMM_AUTO_PROTOCOLS
+        kwargs.pop("transport", None)
+
+        errors = []
+        changed = False
+        for protocol in memo.order(host, protocols):
+            name, _, transport = protocol.partition("+")
+            params = dict(kwargs)
+            if transport:
+                params["transport"] = transport
+
+            started = time.time()
+            try:
+                conn = get_adapter(name)()
+                conn.connect(host, **params)
+            except AuthenticationFailed:
+                raise
+            except ConnectFailed as exc:
+                changed = memo.failed(host, protocol) or changed
+                errors.append("{}: {}".format(protocol, exc))
+                continue
+            except (ImportError, ProtocolException) as exc:
+                # missing here, not a problem with the host
+                errors.append("{}: {}".format(protocol, exc))
+                continue
+
+            changed = memo.record(host, protocol,
+                                  time.time() - started) or changed
+            if changed:
+                memo.save()
+
+            self._conn = conn
+            self.protocol = protocol
+            return
+
+        if changed:
+            memo.save()
+        raise ConnectFailed("No protocol could connect to {}: {}".format(
+            host, "; ".join(errors)))
+
+    def send(self, commands, **kwargs):
+        return self._conn.send(commands, **kwargs)
+
+    def authorize(self, password, username=None):
+        return self._conn.authorize(password, username)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+
+    def alive(self):
+        return self._conn is not None and self._conn.alive()
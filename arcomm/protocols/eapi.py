@@ -8,25 +8,13 @@ from __future__ import (absolute_import, division, print_function,
 
 from arcomm.exceptions import AuthenticationFailed, ConnectFailed, ExecuteFailed
 from arcomm.protocols.protocol import BaseProtocol
-from arcomm.util import zipnpad
+from arcomm.util import prepare_commands, zipnpad
 from arcomm.command import Command
 from pprint import pprint
 import eapi as eapi_
 
 eapi_.SSL_WARNINGS = False
 
-def prepare_commands(commands):
-    """converts commands to Eapi formatted dicts"""
-
-    formatted = []
-    for command in commands:
-        answer = command.answer or ""
-        command = command.cmd.strip()
-
-        formatted.append({"cmd": command, "input": answer})
-
-    return formatted
-
 class Eapi(BaseProtocol):
 
     def __init__(self):
@@ -36,6 +24,9 @@ class Eapi(BaseProtocol):
     def close(self):
         self._session.logout()
 
+    def alive(self):
+        return self._session is not None
+
     def connect(self, host, **kwargs):
         transport = kwargs.get("transport") or "http"
         # cert=None, port=None, auth=None,
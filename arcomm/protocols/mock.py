@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2016 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Mock adapter module. Answers commands locally without a device, useful for
+testing and benchmarking"""
+
+import re
+import time
+
+from arcomm.exceptions import AuthenticationFailed, ConnectFailed
+from arcomm.protocols.protocol import BaseProtocol
+
+# hostnames starting with these prefixes simulate connection problems
+UNREACHABLE_PREFIX = "unreachable"
+BADAUTH_PREFIX = "badauth"
+
+# seconds to wait when connecting, simulates handshake and login
+CONNECT_DELAY = 0
+
+def answer(host, command):
+    """Returns (seconds to wait, output, errored) for a command"""
+
+    cmd = str(command).strip()
+
+    match = re.match(r"sleep(?:\s+([\d\.]+))?$", cmd)
+    if match:
+        return (float(match.group(1) or 1), "", False)
+    elif cmd == "show bogus":
+        return (0, "% Invalid input", True)
+
+    return (0, "{}: {}".format(host, cmd), False)
+
+def check_host(host):
+    """Raises the error a host is set up to simulate"""
+
+    if host.startswith(UNREACHABLE_PREFIX):
+        raise ConnectFailed("Connection to {} timed out".format(host))
+
+    if host.startswith(BADAUTH_PREFIX):
+        raise AuthenticationFailed("Authentication failed")
+
+class Mock(BaseProtocol):
+    """Mock class for faking Arista switches
+
+    Recognized commands:
+
+        sleep <seconds>     waits before answering
+        show bogus          fails like an invalid command
+        anything else       echoes the hostname and command
+
+    Pass `latency` (in seconds) to send to delay every answer
+    """
+
+    def __init__(self):
+        self._host = None
+        self._authorized = False
+
+    def close(self):
+        self._host = None
+
+    def alive(self):
+        return self._host is not None
+
+    def connect(self, host, **kwargs):
+        if CONNECT_DELAY:
+            time.sleep(CONNECT_DELAY)
+
+        check_host(host)
+
+        self._host = host
+
+    def send(self, commands, **kwargs):
+        results = []
+        status_code = 0
+
+        latency = kwargs.get("latency")
+        if latency:
+            time.sleep(latency)
+
+        for command in commands:
+            delay, output, errored = answer(self._host, command)
+            if delay:
+                time.sleep(delay)
+            if errored:
+                status_code = 1
+            results.append([command, output, errored])
+
+        return (results, status_code, "")
+
+    def authorize(self, password, username=None):
+        self._authorized = True
@@ -26,3 +26,38 @@ class BaseProtocol(with_metaclass(abc.ABCMeta, object)):
     @abc.abstractmethod
     def authorize(self, password, username=None):
         pass
+
+    def alive(self):
+        """Return False if the connection is known to be unusable"""
+        return True
+
+class AsyncBaseProtocol(with_metaclass(abc.ABCMeta, object)):
+    """Base for adapters used by :class:`arcomm.session.AsyncSession`, same
+    as `BaseProtocol` but connect, send, authorize and close are coroutines"""
+
+    @abc.abstractmethod
+    async def close(self):
+        pass
+
+    @abc.abstractmethod
+    async def connect(self, host, creds, **kwargs):
+        pass
+
+    @abc.abstractmethod
+    async def send(self, commands, **kwargs):
+        pass
+
+    @abc.abstractmethod
+    async def authorize(self, password, username=None):
+        pass
+
+    async def stream(self, commands, **kwargs):
+        """Yield [command, response, errored] for each command as soon as it
+        is done. Adapters that can't do better send them all at once"""
+        responses, _, _ = await self.send(commands, **kwargs)
+        for response in responses:
+            yield response
+
+    def alive(self):
+        """Return False if the connection is known to be unusable"""
+        return True
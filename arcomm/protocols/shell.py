@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Prompt, error and interactive input handling shared by the adapters that
+drive the switch's CLI over an interactive shell"""
+
+import re
+
+from arcomm.util import to_list
+
+class Shell(object):
+    """Patterns for recognizing the CLI prompt, errors and password prompts
+    in a shell's output"""
+
+    def __init__(self):
+
+        # password prompt expected when authorizing
+        self._password_re = [
+            re.compile(r"[\r\n]?password: ?$", re.I)
+        ]
+
+        # possible command prompts
+        self._prompt_re = [
+            # Match on examples:
+            # cs-spine-2a......14:08:54#
+            # cs-spine-2a[14:08:54]#
+            # cs-spine-2a>
+            # cs-spine-2a#
+            # cs-spine-2a(s1)#
+            # cs-spine-2a(s1)(config)#
+            # cs-spine-2b(vrf:management)(config)#
+            # cs-spine-2b(s1)(vrf:management)(config)#
+            re.compile(r"[\r\n]?[\w+\-\.:\/\[\]]+(?:\([^\)]+\)){,3}(?:>|#) ?$"),
+            # Match on:
+            # [admin@cs-spine-2a /]$
+            # [admin@cs-spine-2a local]$
+            # [admin@cs-spine-2a ~]$
+            re.compile(r"\[\w+\@[\w\-\.]+(?: [^\]])\] ?[>#\$] ?$"),
+            # -bash-4.1#
+            # #
+            re.compile(r"[\r\n]\-?(?:bash)?(?:\-\d\.\d)? ?[>#\$] ?$")
+        ]
+
+        # possible error message patterns
+        self._error_re = [
+            re.compile(r"% ?Error"),
+            re.compile(r"^% \w+", re.M),
+            re.compile(r"% ?Bad secret"),
+            re.compile(r"invalid input", re.I),
+            re.compile(r"(?:incomplete|ambiguous) command", re.I),
+            re.compile(r"connection timed out", re.I),
+            re.compile(r"[^\r\n]+ not found", re.I),
+            re.compile(r"'[^']' +returned error code: ?\d+"),
+            re.compile(r"[^\r\n]\/bin\/(?:ba)?sh")
+        ]
+
+    def _clean_response(self, command, response):
+        cleaned = []
+        for line in response.splitlines():
+            if line.startswith(str(command)):
+                continue
+            if self._handle_prompt(line):
+                continue
+
+            if re.match(r'\x1b[^=]*=', line):
+                continue
+
+            cleaned.append(line)
+
+        return '\n'.join(cleaned)
+
+    def _handle_errors(self, response):
+        """look for errors"""
+
+        for regex in self._error_re:
+            match = regex.search(response)
+            if match:
+                # capture part of output that contains the error,
+                # but do not raise an exception yet.  We need to make
+                # sure to receive all the data from that channel
+                return True
+        return False
+
+    def _answers(self, response, prompt, answer):
+        """answers to send for the interactive prompts found in response"""
+        if prompt is None or answer is None:
+            return []
+
+        re_type = type(re.compile(r'^$'))
+
+        prompt = to_list(prompt)
+        answer = to_list(answer)
+
+        if len(prompt) != len(answer):
+            raise ValueError(("Lists of prompts and answers have different "
+                              "lengths"))
+
+        answers = []
+        for _prompt, _answer in zip(prompt, answer):
+            if not isinstance(_prompt, re_type):
+                _prompt = re.compile(_prompt)
+
+            match = _prompt.search(response)
+            if match:
+                answers.append(_answer)
+        return answers
+
+    def _handle_prompt(self, response):
+        """look for cli prompt"""
+        for regex in self._prompt_re:
+            match = regex.search(response)
+            if match:
+                return True
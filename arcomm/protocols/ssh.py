@@ -8,22 +8,17 @@
 # from __future__ import (absolute_import, division, print_function,
 #                         unicode_literals)
 
+import codecs
 import json
-import re
+import selectors
 import socket
-import time
-
-try:
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
 
 from arcomm.protocols.protocol import BaseProtocol
+from arcomm.protocols.shell import Shell
 from arcomm.exceptions import ConnectFailed, ExecuteFailed, \
                               AuthenticationFailed,  AuthorizationFailed, \
                               ProtocolException
 from arcomm.command import Command
-from arcomm.util import to_list
 
 try:
     import paramiko
@@ -33,10 +28,16 @@ except ImportError:
 
 from contextlib import ExitStack
 
-class Ssh(BaseProtocol):
+# bytes asked for per read, doubled up to the maximum while reads come back
+# full so large outputs take fewer reads
+MIN_RECV_SIZE = 4096
+MAX_RECV_SIZE = 65536
+
+class Ssh(Shell, BaseProtocol):
     """SSH class for interacting with Arista switches"""
 
     def __init__(self):
+        super(Ssh, self).__init__()
 
         # default port for ssh connections
         self._port = 22
@@ -44,105 +45,17 @@ class Ssh(BaseProtocol):
         # default timeout
         self._timeout = 30
 
-        # password prompt expected when authorizing
-        self._password_re = [
-            re.compile(r"[\r\n]?password: ?$", re.I)
-        ]
-
-        # possible command prompts
-        self._prompt_re = [
-            # Match on examples:
-            # cs-spine-2a......14:08:54#
-            # cs-spine-2a[14:08:54]#
-            # cs-spine-2a>
-            # cs-spine-2a#
-            # cs-spine-2a(s1)#
-            # cs-spine-2a(s1)(config)#
-            # cs-spine-2b(vrf:management)(config)#
-            # cs-spine-2b(s1)(vrf:management)(config)#
-            re.compile(r"[\r\n]?[\w+\-\.:\/\[\]]+(?:\([^\)]+\)){,3}(?:>|#) ?$"),
-            # Match on:
-            # [admin@cs-spine-2a /]$
-            # [admin@cs-spine-2a local]$
-            # [admin@cs-spine-2a ~]$
-            re.compile(r"\[\w+\@[\w\-\.]+(?: [^\]])\] ?[>#\$] ?$"),
-            # -bash-4.1#
-            # #
-            re.compile(r"[\r\n]\-?(?:bash)?(?:\-\d\.\d)? ?[>#\$] ?$")
-        ]
-
-        # possible error message patterns
-        self._error_re = [
-            re.compile(r"% ?Error"),
-            re.compile(r"^% \w+", re.M),
-            re.compile(r"% ?Bad secret"),
-            re.compile(r"invalid input", re.I),
-            re.compile(r"(?:incomplete|ambiguous) command", re.I),
-            re.compile(r"connection timed out", re.I),
-            re.compile(r"[^\r\n]+ not found", re.I),
-            re.compile(r"'[^']' +returned error code: ?\d+"),
-            re.compile(r"[^\r\n]\/bin\/(?:ba)?sh")
-        ]
-
         self._banner = None
         self._ssh = None
         self._channel = None
 
-    def _clean_response(self, command, response):
-        cleaned = []
-        for line in response.splitlines():
-            if line.startswith(str(command)):
-                continue
-            if self._handle_prompt(line):
-                continue
-
-            if re.match(r'\x1b[^=]*=', line):
-                continue
-
-            cleaned.append(line)
-
-        return '\n'.join(cleaned)
-
-    def _handle_errors(self, response):
-        """look for errors"""
-
-        for regex in self._error_re:
-            match = regex.search(response)
-            if match:
-                # capture part of output that contains the error,
-                # but do not raise an exception yet.  We need to make
-                # sure to receive all the data from that channel
-                return True
-        return False
+        # wakes up when the channel has data, instead of polling it
+        self._selector = None
 
     def _handle_input(self, response, prompt, answer):
         """look for interactive prompts and send answer"""
-        if prompt is None or answer is None:
-            return
-
-        re_type = type(re.compile(r'^$'))
-
-        prompt = to_list(prompt)
-        answer = to_list(answer)
-
-        if len(prompt) != len(answer):
-            raise ValueError(("Lists of prompts and answers have different "
-                              "lengths"))
-
-        for _prompt, _answer in zip(prompt, answer):
-            if not isinstance(_prompt, re_type):
-                _prompt = re.compile(_prompt)
-
-            match = _prompt.search(response)
-            if match:
-                self._channel.send(_answer + '\r')
-
-    def _handle_prompt(self, response):
-        """look for cli prompt"""
-        for regex in self._prompt_re:
-            match = regex.search(response)
-            if match:
-                return True
+        for _answer in self._answers(response, prompt, answer):
+            self._channel.send(_answer + '\r')
 
     def authorize(self, password, username=None):
         """Authorize the session"""
@@ -155,8 +68,20 @@ class Ssh(BaseProtocol):
 
     def close(self):
         """close the session"""
+        if self._selector:
+            self._selector.close()
+            self._selector = None
         self._ssh.close()
 
+    def alive(self):
+        """check the transport and shell channel are still open"""
+        if not self._ssh or not self._channel:
+            return False
+
+        transport = self._ssh.get_transport()
+        return bool(transport and transport.is_active()
+                    and not self._channel.closed)
+
     def connect(self, host, creds, **kwargs):
         """Connect to a host and invoke the shell.  Returns nothing """
 
@@ -183,9 +108,7 @@ class Ssh(BaseProtocol):
 
         # we must invoke a shell, otherwise session commands like 'enable',
         # 'terminal width', etc. won't stick
-        channel = self._ssh.invoke_shell()
-        channel.settimeout(self._timeout)
-        self._channel = channel
+        self._attach(self._ssh.invoke_shell())
 
         # capture login banner and clear any login messages
         self._banner = self._send(Command('\r'))
@@ -197,6 +120,13 @@ class Ssh(BaseProtocol):
         except ExecuteFailed:
             pass
 
+    def _attach(self, channel):
+        """Use channel as the shell"""
+        channel.settimeout(self._timeout)
+        self._channel = channel
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(channel, selectors.EVENT_READ)
+
     def send(self, commands, **kwargs):
         """Send a series of commands to the device"""
         responses = []
@@ -210,7 +140,7 @@ class Ssh(BaseProtocol):
         # value within this context
         with ExitStack() as stack:
 
-            if timeout and time != self._timeout:
+            if timeout and timeout != self._timeout:
                 stack.callback(self._channel.settimeout, self._timeout)
                 self._channel.settimeout(timeout)
 
@@ -231,41 +161,57 @@ class Ssh(BaseProtocol):
 
         return responses, status_code, ""
 
+    def _recv(self, size, command):
+        """Wait for data on the channel and read up to size bytes"""
+
+        if not self._channel.recv_ready():
+            if not self._selector.select(self._channel.gettimeout()):
+                message = "% Timed out while running: {}".format(command)
+                raise ExecuteFailed(message)
+
+        try:
+            data = self._channel.recv(size)
+        except socket.timeout:
+            message = "% Timed out while running: {}".format(command)
+            raise ExecuteFailed(message)
+
+        if not data:
+            message = "% Connection closed while running: {}".format(command)
+            raise ExecuteFailed(message)
+
+        return data
+
     def _send(self, command):
         """Sends a command to the remote device and returns the response"""
 
-        buff = StringIO()
+        buff = []
+        window = ""
 
         errored_response = None
 
+        # multi-byte characters may be split between reads
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        size = MIN_RECV_SIZE
+
         self._channel.sendall(str(command) + '\r')
-        # wait for channel to be recv_ready (only seems to be a problem in py3)
-        while not self._channel.recv_ready():
-            # waiting for channel to be recv_ready...
-            time.sleep(.01)
 
         while True:
-            try:
-                response = self._channel.recv(1024).decode("utf-8")
-            except socket.timeout:
-                message = "% Timed out while running: {}".format(command)
-                raise ExecuteFailed(message)
+            data = self._recv(size, command)
+            if len(data) == size:
+                size = min(size * 2, MAX_RECV_SIZE)
 
-            buff.write(response)
-            place = buff.tell() - 150
-            if place < 0:
-                place = 0
-            buff.seek(place)
-            window = buff.read()
+            response = decoder.decode(data)
+            buff.append(response)
+            window = (window + response)[-150:]
 
             if self._handle_errors(window):
-                errored_response = buff.getvalue()
+                errored_response = "".join(buff)
 
             # deal with interactive input
             self._handle_input(window, command.prompt, command.answer)
 
             if self._handle_prompt(window):
-                data = buff.getvalue()
+                data = "".join(buff)
                 data = self._clean_response(command, data)
                 if errored_response:
                     raise ExecuteFailed(errored_response)
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Admission control for pooled sessions: concurrency limits and token bucket
+rate limiting, fleet-wide and per group of hosts"""
+
+import collections
+import fnmatch
+import threading
+import time
+
+from arcomm import env
+from arcomm.util import parse_endpoint
+
+class TokenBucket(object):
+    """Allows `rate` tokens per second with bursts of up to `burst` tokens"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.time()
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self):
+        """Seconds until a token is available, 0 if one is available now"""
+        self._refill()
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def consume(self):
+        self._refill()
+        self._tokens -= 1
+
+class _Limit(object):
+    """Concurrency and rate limit for one group of hosts"""
+
+    def __init__(self, max_sessions=None, rate=None, burst=None):
+        self.max_sessions = max_sessions
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.active = 0
+
+    def delay(self):
+        """0 if a session may start now, seconds to wait for a token or None
+        to wait for a running session to finish"""
+
+        if self.max_sessions and self.active >= self.max_sessions:
+            return None
+
+        if self.bucket:
+            return self.bucket.delay()
+
+        return 0
+
+    def acquire(self):
+        self.active += 1
+        if self.bucket:
+            self.bucket.consume()
+
+    def release(self):
+        self.active -= 1
+
+class Limiter(object):
+    """Limits how many sessions run at once and how many new ones start per
+    second, across the fleet and per group
+
+    :param max_sessions: maximum sessions running at once
+    :param rate: new sessions started per second
+    :param burst: new sessions allowed to start at once when tokens have
+                  built up, defaults to `rate`
+    :param groups: dict of limits by group, e.g.
+                   ``{"nyc-*": {"max_sessions": 10, "rate": 2}}``. A host
+                   belongs to the group named by its ``group`` session
+                   parameter or else to the first hostname pattern it matches
+
+    A single limiter may be shared by several pools to protect the same
+    AAA servers.
+    """
+
+    def __init__(self, max_sessions=None, rate=None, burst=None, groups=None):
+        self._global = _Limit(max_sessions, rate, burst)
+        self._groups = {}
+
+        for name, limits in (groups or {}).items():
+            self._groups[name] = _Limit(**limits)
+
+        self._cond = threading.Condition()
+
+    def group(self, endpoint, params=None):
+        """Name of the group the endpoint belongs to, or None"""
+
+        tag = (params or {}).get("group")
+        if tag is not None:
+            return tag if tag in self._groups else None
+
+        hostname = parse_endpoint(str(endpoint))["hostname"]
+        for pattern in self._groups:
+            if fnmatch.fnmatch(hostname, pattern):
+                return pattern
+
+    def _limits(self, group):
+        limits = [self._global]
+        if group is not None:
+            limits.append(self._groups[group])
+        return limits
+
+    def _delay(self, group):
+        """0 if a host in the group may start now, otherwise seconds to wait
+        for a token or None to wait for a release"""
+
+        wait = 0
+        for limit in self._limits(group):
+            delay = limit.delay()
+            if delay is None:
+                return None
+            wait = max(wait, delay)
+        return wait
+
+    def _acquire(self, group):
+        for limit in self._limits(group):
+            limit.acquire()
+
+    def acquire(self, group=None):
+        """Block until a host in the group may start"""
+
+        with self._cond:
+            while True:
+                wait = self._delay(group)
+                if wait == 0:
+                    self._acquire(group)
+                    return
+                self._cond.wait(wait)
+
+    def admit(self, candidates, timeout=None):
+        """Block until one of the candidates may start and return it
+
+        :param candidates: list of (item, group) tuples in order of preference
+        :param timeout: give up and return None after this many seconds
+        """
+
+        deadline = time.time() + timeout if timeout is not None else None
+
+        with self._cond:
+            while True:
+                waits = []
+
+                wait = self._global.delay()
+                if wait == 0:
+                    blocked = set()
+                    for item, group in candidates:
+                        if group in blocked:
+                            continue
+                        wait = self._delay(group)
+                        if wait == 0:
+                            self._acquire(group)
+                            return item
+                        blocked.add(group)
+                        waits.append(wait)
+                else:
+                    waits.append(wait)
+
+                waits = [wait for wait in waits if wait is not None]
+                wait = min(waits) if waits else None
+
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    wait = min(wait, remaining) if wait else remaining
+
+                self._cond.wait(wait)
+
+    def release(self, group=None):
+        with self._cond:
+            for limit in self._limits(group):
+                limit.release()
+            self._cond.notify_all()
+
+class AdaptiveLimiter(Limiter):
+    """Limiter that finds its own `max_sessions` with additive increase and
+    multiplicative decrease (AIMD)
+
+    After every `window` finished hosts the limit grows by `increase` if
+    latency stayed near the best seen so far, or shrinks by the `decrease`
+    factor if latency grew past `tolerance` times that or too many hosts
+    failed or timed out.
+
+    :param initial: sessions allowed to run at first
+    :param minimum: never allow fewer sessions than this
+    :param maximum: never allow more sessions than this
+    :param increase: sessions added after a healthy window
+    :param decrease: factor applied to the limit after an unhealthy window
+    :param tolerance: how much latency may grow over the best seen so far
+    :param error_rate: fraction of failed hosts in a window that is unhealthy
+    :param window: hosts per decision, defaults to the current limit
+
+    Decisions are kept in `decisions` and summarized by `metrics`.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=None, increase=1,
+                 decrease=.5, tolerance=2.0, error_rate=.05, window=None,
+                 rate=None, burst=None, groups=None):
+
+        super(AdaptiveLimiter, self).__init__(initial, rate, burst, groups)
+
+        self.minimum = minimum
+        self.maximum = maximum or env.ARCOMM_DEFAULT_CONCURRENCY
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.error_rate = error_rate
+        self.window = window
+
+        # best median latency seen, allowed to creep up slowly
+        self._baseline = None
+
+        self._latencies = []
+        self._count = 0
+        self._errors = 0
+
+        # (time, limit, latency, error rate, action)
+        self.decisions = collections.deque(maxlen=1000)
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def limit(self):
+        return self._global.max_sessions
+
+    def observe(self, latency=None, failed=False):
+        """Record how a host went, latency in seconds"""
+
+        with self._cond:
+            self._count += 1
+            if failed:
+                self._errors += 1
+            elif latency is not None:
+                self._latencies.append(latency)
+
+            if self._count >= (self.window or self.limit):
+                self._decide()
+
+    def _decide(self):
+        latency = None
+        if self._latencies:
+            latencies = sorted(self._latencies)
+            latency = latencies[len(latencies) // 2]
+
+        error_rate = self._errors / float(self._count)
+
+        slow = False
+        if latency is not None:
+            if self._baseline is None:
+                self._baseline = latency
+            slow = latency > self._baseline * self.tolerance
+            self._baseline = min(latency, self._baseline * 1.05)
+
+        if slow or error_rate > self.error_rate:
+            limit = max(self.minimum, int(self.limit * self.decrease))
+        else:
+            limit = min(self.maximum, self.limit + self.increase)
+
+        if limit > self.limit:
+            action = "increase"
+            self.increases += 1
+        elif limit < self.limit:
+            action = "decrease"
+            self.decreases += 1
+        else:
+            action = "hold"
+
+        self._global.max_sessions = limit
+        self.decisions.append((time.time(), limit, latency, error_rate,
+                               action))
+
+        self._latencies = []
+        self._count = 0
+        self._errors = 0
+
+        self._cond.notify_all()
+
+    def metrics(self):
+        """Current state of the controller"""
+
+        with self._cond:
+            last = self.decisions[-1] if self.decisions else None
+            return {
+                "limit": self.limit,
+                "active": self._global.active,
+                "baseline": self._baseline,
+                "latency": last[2] if last else None,
+                "error_rate": last[3] if last else None,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "decisions": len(self.decisions)
+            }
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Keep connected sessions around for reuse"""
+
+import atexit
+import collections
+import collections.abc
+import contextlib
+import os
+import threading
+import time
+import weakref
+
+from arcomm import env
+from arcomm.session import Session
+from arcomm.util import parse_endpoint
+
+# process-wide registry, see `get_registry`
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+def session_key(endpoint, creds=None, protocol=None, port=None,
+                transport=None, **kwargs):
+    """Build a hashable key from the parameters that identify a connection:
+    hostname, protocol and transport, credentials and port. Other options,
+    such as a timeout or a response cache, don't change which device is
+    talked to and are left out. The same session given as a URI or as
+    separate arguments gets the same key"""
+
+    parsed = parse_endpoint(str(endpoint))
+
+    protocol = (parsed["protocol"] or protocol or
+                env.ARCOMM_DEFAULT_PROTOCOL)
+    if "+" in protocol:
+        protocol, transport = protocol.split("+", 1)
+
+    if parsed["username"]:
+        creds = (parsed["username"], parsed["password"] or "")
+
+    # (username, password) and BasicCreds(username, password) are the same
+    if isinstance(creds, (tuple, list)):
+        creds = dict(zip(("username", "password"), creds))
+        creds.setdefault("password", "")
+    if isinstance(creds, collections.abc.Mapping):
+        creds = tuple(sorted(creds.items()))
+
+    return (parsed["hostname"], protocol, transport, creds,
+            parsed["port"] or port)
+
+def _is_alive(session):
+    return session.alive
+
+class SessionRegistry(object):
+    """LRU cache of idle, connected sessions
+
+    Sessions are checked out while in use and checked back in when done, so
+    the same session is never handed to two callers at once.
+
+    :param maxsize: maximum number of idle sessions kept, the least recently
+                    used is closed when full
+    :param idle_timeout: seconds a session may sit idle before being closed
+    :param health_check: callable returning True if a cached session is still
+                         usable, defaults to checking `Session.alive`
+    :param reap: (optional) close idle sessions in a background thread as
+                 soon as they time out, rather than on the next checkout or
+                 checkin
+    """
+
+    def __init__(self, maxsize=None, idle_timeout=None, health_check=None,
+                 reap=False):
+
+        self.maxsize = maxsize or env.ARCOMM_SESSION_CACHE_SIZE
+
+        self.idle_timeout = idle_timeout or env.ARCOMM_SESSION_IDLE_TIMEOUT
+
+        self.health_check = health_check or _is_alive
+
+        # key -> (session, last used)
+        self._idle = collections.OrderedDict()
+
+        # session -> key, for sessions currently checked out. Sessions the
+        # caller drops without checking in are forgotten
+        self._keys = weakref.WeakKeyDictionary()
+
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+        self._reap = reap
+        self._reaper = None
+        self._reaper_pid = None
+        self._stopped = threading.Event()
+
+    def __len__(self):
+        return len(self._idle)
+
+    def __contains__(self, key):
+        return key in self._idle
+
+    def configure(self, maxsize=None, idle_timeout=None, health_check=None):
+        """Change the cache limits, evicting sessions if needed"""
+        with self._lock:
+            if maxsize:
+                self.maxsize = maxsize
+            if idle_timeout:
+                self.idle_timeout = idle_timeout
+            if health_check:
+                self.health_check = health_check
+            self._evict()
+
+    def _close(self, session):
+        try:
+            session.close()
+        except Exception:
+            pass
+
+    def _evict(self):
+        """Close sessions that have been idle for too long and the least
+        recently used ones above maxsize"""
+
+        now = time.time()
+        expired = [key for key, (_, used) in self._idle.items()
+                   if now - used > self.idle_timeout]
+
+        for key in expired:
+            session, _ = self._idle.pop(key)
+            self._close(session)
+
+        while len(self._idle) > self.maxsize:
+            _, (session, _) = self._idle.popitem(last=False)
+            self._close(session)
+
+    def checkout(self, endpoint, **kwargs):
+        """Return a healthy cached session for the endpoint or a new one"""
+
+        key = session_key(endpoint, **kwargs)
+        session = None
+
+        with self._lock:
+            self._evict()
+            if key in self._idle:
+                session, _ = self._idle.pop(key)
+
+        if session is not None and not self.health_check(session):
+            self._close(session)
+            session = None
+
+        with self._lock:
+            if session is None:
+                self.misses += 1
+                session = Session(endpoint, **kwargs)
+            else:
+                self.hits += 1
+
+            self._keys[session] = key
+
+        return session
+
+    def owns(self, session):
+        """True if the session is checked out from this registry"""
+        return session in self._keys
+
+    def checkin(self, session):
+        """Return a session to the cache once the caller is done with it"""
+
+        with self._lock:
+            key = self._keys.pop(session, None)
+
+            if key is None or not session.connected:
+                return
+
+            if key in self._idle:
+                # another caller already returned a session for this key
+                self._close(session)
+                return
+
+            self._idle[key] = (session, time.time())
+            self._evict()
+
+        if self._reap:
+            self._start_reaper()
+
+    @contextlib.contextmanager
+    def session(self, endpoint, **kwargs):
+        """Check out a connected session for the duration of a with block,
+        it is discarded instead of returned if the block raises"""
+
+        session = self.checkout(endpoint, **kwargs)
+        try:
+            if not session.connected:
+                session.connect()
+            yield session
+        except Exception:
+            self.discard(session)
+            raise
+        else:
+            self.checkin(session)
+
+    def _start_reaper(self):
+        with self._lock:
+            # threads don't survive a fork, workers start their own
+            if (self._reaper is not None and self._reaper.is_alive() and
+                    self._reaper_pid == os.getpid()):
+                return
+
+            self._stopped.clear()
+            self._reaper_pid = os.getpid()
+            self._reaper = threading.Thread(target=self._run_reaper,
+                                            name="arcomm-reaper")
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def _run_reaper(self):
+        while True:
+            interval = min(max(self.idle_timeout / 4.0, .05), 60)
+            if self._stopped.wait(interval):
+                return
+
+            with self._lock:
+                self._evict()
+                if not self._idle:
+                    # started again by the next checkin
+                    self._reaper = None
+                    return
+
+    def discard(self, session):
+        """Close a checked out session instead of returning it to the cache"""
+
+        with self._lock:
+            self._keys.pop(session, None)
+
+        self._close(session)
+
+    def clear(self):
+        """Close every idle session"""
+
+        self._stopped.set()
+
+        with self._lock:
+            sessions = [session for session, _ in self._idle.values()]
+            self._idle.clear()
+
+        for session in sessions:
+            self._close(session)
+
+def get_registry():
+    """The registry shared by everything in this process: `arcomm.connect`
+    and `arcomm.execute` with ``reuse=True`` and pool workers keeping their
+    sessions. Limits come from `ARCOMM_SESSION_CACHE_SIZE` and
+    `ARCOMM_SESSION_IDLE_TIMEOUT` and can be changed with `configure`"""
+
+    global _REGISTRY
+
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = SessionRegistry(reap=True)
+        return _REGISTRY
+
+@atexit.register
+def _close_sessions():
+    if _REGISTRY is not None:
+        _REGISTRY.clear()
@@ -8,7 +8,6 @@
 import json
 import re
 import time
-import yaml
 import arcomm
 from arcomm.util import to_list, indentblock
 from arcomm.exceptions import ExecuteFailed
@@ -66,11 +65,15 @@ class Response(object):
 class ResponseStore(object):
     """List-like object for storing responses"""
 
-    def __init__(self, session, **kwargs):
+    def __init__(self, session, host=None, **kwargs):
 
         self._store = []
         self.session = session
+        self._host = host
         self.status = 'ok'
+
+        # extra details about how the responses were gathered, e.g. timings
+        self.metadata = {}
         self._keywords = kwargs
 
         self._subscribers = []
@@ -84,6 +87,53 @@ class ResponseStore(object):
     def __str__(self):
         return self.to_yaml()
 
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a store from `to_dict` output, subscribers are not
+        notified"""
+
+        store = cls(None, host=data['host'])
+        for item in data['commands']:
+            command = arcomm.command.Command(item['command'])
+            store._store.append(Response(store, command, item['output'],
+                                         item['errored']))
+        store.status = data['status']
+        store.metadata = data.get('metadata') or {}
+        return store
+
+    def to_tuple(self):
+        """Compact, picklable form of the store used to send results between
+        processes. The session is left out, `from_tuple` rebuilds the store
+        with ``session=None``"""
+
+        responses = []
+        for response in self._store:
+            command = response.command
+            if isinstance(command, arcomm.command.Command):
+                command = (command.cmd, command.prompt, command.answer)
+            else:
+                command = (command, None, None)
+            responses.append(command + (response.output, response.errored))
+
+        return (self.host, self.status, tuple(responses),
+                self.metadata or None, self._keywords or None)
+
+    @classmethod
+    def from_tuple(cls, data):
+        """Rebuild a store from `to_tuple` output, subscribers are not
+        notified"""
+
+        host, status, responses, metadata = data[:4]
+        keywords = data[4] if len(data) > 4 else None
+
+        store = cls(None, host=host, **(keywords or {}))
+        for cmd, prompt, answer, output, errored in responses:
+            command = arcomm.command.Command(cmd, prompt=prompt, answer=answer)
+            store._store.append(Response(store, command, output, errored))
+        store.status = status
+        store.metadata = metadata or {}
+        return store
+
     def to_dict(self):
         result = {'host': self.host, 'status': self.status, 'commands': []}
 
@@ -95,7 +145,9 @@ class ResponseStore(object):
 
     @property
     def host(self):
-        return self.session.hostname
+        if self._host is None:
+            return self.session.hostname
+        return self._host
 
     def to_yaml(self):
         doc = ['host: {}'.format(self.host)]
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Retry transient failures with exponential backoff and jitter"""
+
+import random
+import time
+
+from arcomm.exceptions import ConnectFailed, ExecuteFailed
+
+class RetryPolicy(object):
+    """Describes when and how often to retry a failed operation
+
+    :param attempts: total tries including the first one
+    :param backoff: seconds to wait before the first retry
+    :param factor: the wait is multiplied by this after every retry
+    :param max_backoff: never wait longer than this
+    :param jitter: fraction of each wait that is randomized, spreads out
+                   retries from many hosts failing at once
+    :param retry_on: exception classes worth retrying. Authentication
+                     failures are not retried by default so accounts don't
+                     get locked out
+    :param budget: maximum retries for a session across connect and all its
+                   executes, defaults to no limit beyond `attempts`
+
+    Sessions only retry executing commands that are all read-only, see
+    `arcomm.cache.is_readonly`. Configuration may already have been applied
+    when the failure is reported, sending it again isn't safe.
+    """
+
+    def __init__(self, attempts=3, backoff=.5, factor=2, max_backoff=30,
+                 jitter=.5, retry_on=(ConnectFailed, ExecuteFailed),
+                 budget=None):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = tuple(retry_on)
+        self.budget = budget
+
+    def __repr__(self):
+        return ("{}(attempts={}, backoff={}, factor={}, max_backoff={}, "
+                "jitter={}, retry_on={}, budget={})").format(
+                    self.__class__.__name__, self.attempts, self.backoff,
+                    self.factor, self.max_backoff, self.jitter,
+                    [cls.__name__ for cls in self.retry_on], self.budget)
+
+    def delay(self, attempt):
+        """Seconds to wait after the given failed attempt (starting at 1)"""
+
+        delay = min(self.max_backoff,
+                    self.backoff * self.factor ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def run(self, func, on_retry=None):
+        """Call func until it succeeds, raises something not worth retrying or
+        runs out of attempts
+
+        :param on_retry: called with (attempt, exception, delay) before each
+                         retry, returning False gives up and re-raises
+        """
+
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except self.retry_on as exc:
+                if attempt >= self.attempts:
+                    raise
+
+                delay = self.delay(attempt)
+                if on_retry and on_retry(attempt, exc, delay) is False:
+                    raise
+
+                time.sleep(delay)
+                attempt += 1
+
+    async def run_async(self, func, on_retry=None):
+        """Same as `run` for a coroutine function, waits without blocking the
+        event loop"""
+        import asyncio
+
+        attempt = 1
+        while True:
+            try:
+                return await func()
+            except self.retry_on as exc:
+                if attempt >= self.attempts:
+                    raise
+
+                delay = self.delay(attempt)
+                if on_retry and on_retry(attempt, exc, delay) is False:
+                    raise
+
+                await asyncio.sleep(delay)
+                attempt += 1
+
+def mkpolicy(retry):
+    """Build a policy from a number of attempts, a dict of options or an
+    existing policy"""
+
+    if retry is None or isinstance(retry, RetryPolicy):
+        return retry
+    elif isinstance(retry, dict):
+        return RetryPolicy(**retry)
+    elif retry is True:
+        return RetryPolicy()
+    elif retry is False:
+        return None
+
+    return RetryPolicy(attempts=int(retry))
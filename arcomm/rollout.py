@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Push commands to a fleet in waves, stopping early when too many hosts fail
+"""
+
+import importlib
+import math
+import time
+
+from arcomm import env
+from arcomm.engines import create_engine
+from arcomm.ratelimit import Limiter
+from arcomm.util import to_list
+
+_async = importlib.import_module("arcomm.async")
+Pool = _async.Pool
+_exception_store = _async._exception_store
+
+DEFAULT_WAVES = (
+    {"name": "canary", "hosts": 1, "max_sessions": 1},
+    {"name": "5%", "fraction": .05, "max_sessions": 10},
+    {"name": "25%", "fraction": .25, "max_sessions": 25},
+    {"name": "100%", "fraction": 1.0,
+     "max_sessions": env.ARCOMM_DEFAULT_CONCURRENCY}
+)
+
+def plan(count, waves=None):
+    """Split `count` hosts into waves, returns a list of (wave, start, stop)
+    slices. Empty waves are dropped"""
+
+    slices = []
+    done = 0
+    for wave in waves or DEFAULT_WAVES:
+        if "hosts" in wave:
+            stop = done + wave["hosts"]
+        else:
+            stop = int(math.ceil(count * wave["fraction"]))
+        stop = min(count, stop)
+
+        if stop > done:
+            slices.append((wave, done, stop))
+            done = stop
+
+    return slices
+
+class Rollout(object):
+    """Runs commands on the endpoints one wave at a time, each wave on its own
+    `Pool` with its own concurrency
+
+    A wave is aborted, and no further hosts are started, as soon as enough of
+    its hosts failed that its error rate is sure to exceed `max_error_rate`.
+    Results are yielded as hosts finish, hosts that were never started are
+    listed in `skipped` instead.
+
+    :param waves: (optional) list of dicts with a ``name``, the size as
+                  ``hosts`` (a count) or ``fraction`` (share of the whole
+                  fleet done by the end of the wave) and the wave's
+                  ``max_sessions``. Defaults to a single canary host then 5%,
+                  25% and 100% of the fleet
+    :param max_error_rate: (optional) fraction of a wave's hosts allowed to
+                           fail, by default any failure aborts
+    :param pause: (optional) seconds to wait between waves
+    :param configure: (optional) wrap the commands in configure/end
+    :param engine: (optional) Pool engine, shared by every wave
+
+    Other keyword arguments are passed to each `Pool`.
+
+    Usage:
+        >>> rollout = Rollout(hosts, ['ntp server 10.0.0.1'], configure=True)
+        >>> for result in rollout:
+        ...     print(result.host, result.status)
+        >>> rollout.aborted
+        'canary'
+    """
+
+    def __init__(self, endpoints, commands, waves=None, max_error_rate=0,
+                 pause=0, configure=False, engine=None, processes=None,
+                 **kwargs):
+
+        self._endpoints = to_list(endpoints)
+
+        commands = to_list(commands)
+        if configure:
+            commands = ["configure"] + commands + ["end"]
+        self._commands = commands
+
+        self._waves = plan(len(self._endpoints), waves)
+        self._max_error_rate = max_error_rate
+        self._pause = pause
+        self._engine = engine
+        self._processes = processes
+        self._options = kwargs
+
+        # name of the wave that was aborted, if any
+        self.aborted = None
+
+        # (name, hosts, failed) for each wave run
+        self.summary = []
+
+        self.skipped = []
+
+    def __iter__(self):
+        engine = self._engine
+        if not hasattr(engine, "apply_async"):
+            engine = create_engine(engine, self._processes)
+
+        try:
+            for number, (wave, start, stop) in enumerate(self._waves):
+                if number and self._pause:
+                    time.sleep(self._pause)
+
+                for result in self._run(wave, start, stop, engine):
+                    yield result
+
+                if self.aborted:
+                    self.skipped.extend(self._endpoints[stop:])
+                    break
+        finally:
+            if engine is not self._engine:
+                engine.close()
+                engine.join()
+
+    def _run(self, wave, start, stop, engine):
+        endpoints = self._endpoints[start:stop]
+        name = wave.get("name", str(len(self.summary)))
+        allowed = self._max_error_rate * len(endpoints)
+        limiter = Limiter(wave.get("max_sessions"))
+        failed = 0
+
+        with Pool(endpoints, self._commands, engine=engine, limiter=limiter,
+                  **self._options) as pool:
+
+            for host_result in pool.finished():
+                try:
+                    result = host_result.get()
+                except Exception:
+                    result = _exception_store(host_result.endpoint)
+
+                if result.status == "cancelled":
+                    # stopped before it started
+                    self.skipped.append(host_result.endpoint)
+                    continue
+
+                if result.status != "ok":
+                    failed += 1
+
+                if failed > allowed and not self.aborted:
+                    self.aborted = name
+                    pool.stop()
+
+                yield result
+
+        self.summary.append((name, len(endpoints), failed))
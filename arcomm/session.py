@@ -7,7 +7,6 @@ from __future__ import (absolute_import, division, print_function,
 
 from getpass import getpass
 import copy
-import importlib
 import re
 import time
 from arcomm import env
@@ -16,26 +15,15 @@ from arcomm.command import commands_from_list
 from arcomm.response import ResponseStore, Response
 from arcomm.credentials import BasicCreds
 from arcomm.exceptions import ExecuteFailed
+from arcomm.protocols.adapters import get_adapter
 from arcomm.protocols.protocol import BaseProtocol
-from future.standard_library import install_aliases
-install_aliases()
-from urllib.parse import urlparse
+from arcomm.retry import mkpolicy
+from arcomm.cache import is_readonly, mkcache
+from arcomm.coalesce import mkflight
 
 def _load_protocol_adapter(name):
-    """Load protocol module from name"""
-
-    package = None
-    if __name__ == "__main__":
-        package = "arcomm"
-    else:
-        package, _ = __name__.split(".", 1)
-
-    path = ".".join((package, "protocols", name))
-    module = importlib.import_module(path)
-    class_ = re.sub(r"_", "", name.title())
-
-    # Finally, we retrieve the Class
-    return getattr(module, class_)
+    """Load protocol adapter class from name"""
+    return get_adapter(name)
 
 class Session(object):
     """
@@ -49,6 +37,21 @@ class Session(object):
         # true if session is authorized (enabled)
         self.authorized = False
 
+        # optional policy for retrying failed connects and executes
+        self._retry = mkpolicy(kwargs.pop("retry", None))
+
+        # optional cache for the output of read-only commands
+        self._cache = mkcache(kwargs.pop("cache", None))
+
+        # optional `SingleFlight` sharing identical requests made at once
+        self._flights = mkflight(kwargs.pop("coalesce", None))
+
+        # retries made since the last execute
+        self._retries = []
+
+        # retries left for the session's lifetime, None for no limit
+        self._retry_budget = self._retry.budget if self._retry else None
+
         self.params = kwargs
 
         # save original endpoint
@@ -84,7 +87,7 @@ class Session(object):
             self.params["transport"] = transport
 
         self.params["protocol"] = protocol
-        self._protocol_adapter = _load_protocol_adapter(protocol)
+        self._protocol_adapter = self._load_adapter(protocol)
 
     def __enter__(self):
         self.connect()
@@ -100,6 +103,9 @@ class Session(object):
         return "<{} [{}]>".format(self.__class__.__name__,
                                   isinstance(self._conn, BaseProtocol))
 
+    def _load_adapter(self, protocol):
+        return _load_protocol_adapter(protocol)
+
     def _handle_creds(self, creds):
         if isinstance(creds, (tuple, list)):
             creds = BasicCreds(*creds)
@@ -109,12 +115,76 @@ class Session(object):
     def connected(self):
         return True if self._conn else False
 
-    def connect(self): #, uri, **kwargs):
+    @property
+    def alive(self):
+        """True if connected and the protocol adapter still thinks the
+        connection is usable"""
+        return self.connected and self._conn.alive()
+
+    @property
+    def cache(self):
+        """The session's `ResponseCache` or None"""
+        return self._cache
+
+    @property
+    def retry(self):
+        """The session's `RetryPolicy` or None"""
+        return self._retry
+
+    def _reset_retries(self):
+        self._retries = []
+
+    def _on_retry(self, stage, attempt, exc, delay):
+        if self._retry_budget is not None:
+            if self._retry_budget <= 0:
+                return False
+            self._retry_budget -= 1
+
+        self._retries.append({"stage": stage, "attempt": attempt,
+                              "error": str(exc), "delay": delay})
+
+        # start over with a new connection if the old one is gone
+        if stage == "execute" and not self.alive:
+            self._discard()
+
+    def _discard(self):
+        try:
+            self.close()
+        except Exception:
+            self._conn = None
+
+    def _with_retry(self, stage, func):
+        if not self._retry:
+            return func()
+
+        return self._retry.run(func, on_retry=lambda *args:
+                               self._on_retry(stage, *args))
+
+    def _retried(self, commands):
+        """True if a failed execute of commands may be sent again. Anything
+        but read-only commands may have been applied before failing"""
+        return all(is_readonly(command)
+                   for command in commands_from_list(commands))
+
+    def _execute_retried(self, commands, **kwargs):
+        execute = lambda: self._execute(commands, **kwargs)
+        if not self._retried(commands):
+            return execute()
+        return self._with_retry("execute", execute)
+
+    def _connect(self):
         self._conn = self._protocol_adapter()
         self._conn.connect(self.hostname, **self.params)
+        if self.authorized:
+            self._conn.authorize(*self.authorized)
+
+    def connect(self): #, uri, **kwargs):
+        self._with_retry("connect", self._connect)
 
     def authorize(self, password="", username=None):
-        self._conn.authorize(password, username)
+        """Enter enable mode, now or when the session connects"""
+        if self.connected:
+            self._conn.authorize(password, username)
         self.authorized = (password, username)
 
     enable = authorize
@@ -124,9 +194,12 @@ class Session(object):
             hostname = self.hostname
 
         _params = copy.copy(self.params)
+        _params["retry"] = self._retry
+        _params["cache"] = self._cache
+        _params["coalesce"] = self._flights
         params = dictmerge(_params, kwargs)
 
-        cloned = Session(hostname, **params)
+        cloned = self.__class__(hostname, **params)
         cloned.connect()
         return cloned
 
@@ -146,20 +219,107 @@ class Session(object):
             command, response, errored = item
             yield (command, response, errored)
 
-    def execute(self, commands, **kwargs):
+    def _execute(self, commands, **kwargs):
         if not self.connected:
             self.connect()
 
+        return list(self._send(commands, **kwargs))
+
+    def _make_store(self, responses, **kwargs):
         #store = ResponseStore(host=self.hostname)
         store = ResponseStore(session=self)
 
+        if self._retries:
+            store.metadata["retries"] = self._retries
+
         if "callback" in kwargs:
             store.subscribe(kwargs["callback"])
 
-        for response in self._send(commands, **kwargs):
+        for response in responses:
             store.append(Response(store, *response))
         return store
 
+    def _execute_cached(self, commands, **kwargs):
+        """Answer what can be answered from the cache and send the rest,
+        returns the responses and the number of cache hits"""
+
+        cache = self._cache
+        commands = commands_from_list(commands)
+
+        if not all(cache.cacheable(command) for command in commands):
+            cache.bypass(self.hostname)
+            return self._execute_retried(commands, **kwargs), 0
+
+        encoding = kwargs.get("encoding", "text")
+        privilege = 15 if self.authorized else 1
+        keys = [cache.key(self.hostname, command, encoding, privilege)
+                for command in commands]
+        found = [cache.get(key) for key in keys]
+
+        missing = [command for command, hit in zip(commands, found)
+                   if hit is None]
+        fetched = []
+        if missing:
+            fetched = self._execute_retried(missing, **kwargs)
+
+        responses = []
+        fetched = iter(fetched)
+        for key, command, hit in zip(keys, commands, found):
+            if hit is None:
+                response = next(fetched)
+                cache.put(key, *response)
+            else:
+                response = (command,) + tuple(hit)
+            responses.append(response)
+
+        return responses, len(commands) - len(missing)
+
+    def _flight_key(self, commands, **kwargs):
+        """Key identifying the request if it may be coalesced, else None"""
+
+        commands = commands_from_list(commands)
+        if self._flights is None or not all(is_readonly(command)
+                                            for command in commands):
+            return None
+
+        return (self.hostname, tuple(str(command).strip()
+                                     for command in commands),
+                kwargs.get("encoding", "text"), 15 if self.authorized else 1)
+
+    def _fetch(self, commands, **kwargs):
+        """Responses and number of cache hits (None without a cache)"""
+
+        if self._cache is None:
+            return self._execute_retried(commands, **kwargs), None
+
+        return self._execute_cached(commands, **kwargs)
+
+    def _finish_store(self, fetched, shared, **kwargs):
+        (responses, hits) = fetched
+        if shared:
+            # every caller gets its own copy of the shared responses
+            responses = copy.deepcopy(responses)
+
+        store = self._make_store(responses, **kwargs)
+        if hits is not None:
+            store.metadata["cache_hits"] = hits
+        if shared:
+            store.metadata["coalesced"] = True
+        return store
+
+    def execute(self, commands, **kwargs):
+        try:
+            key = self._flight_key(commands, **kwargs)
+            if key is None:
+                fetched, shared = self._fetch(commands, **kwargs), False
+            else:
+                fetched, shared = self._flights.do(key, lambda:
+                                                   self._fetch(commands,
+                                                               **kwargs))
+            return self._finish_store(fetched, shared, **kwargs)
+        finally:
+            self._reset_retries()
+
     send = execute
 
     def execute_until(self, commands, condition, timeout, sleep=1,
@@ -169,6 +329,7 @@ class Session(object):
         only if the string is _not_ present"""
 
         timeout = timeout or env.ARCOMM_DEFAULT_TIMEOUT
+        condition = re.compile(condition)
 
         start_time = time.time()
         check_time = start_time
@@ -178,7 +339,7 @@ class Session(object):
         while (check_time - timeout) < start_time:
             response = self.execute(commands, **kwargs)
 
-            match = re.search(re.compile(condition), str(response))
+            match = condition.search(str(response))
             if exclude:
                 if not match:
                     return response
@@ -192,5 +353,142 @@ class Session(object):
     def execute_while(self, commands, condition, **kwargs):
         self.execute_until(commands, condition, exclude=True, **kwargs)
 
+class AsyncSession(Session):
+    """Session driven from a coroutine. Uses the protocol's async adapter
+    (``async_eapi`` for ``eapi``) and connect, execute, authorize and close
+    are coroutines::
+
+        async with AsyncSession("eapi://veos") as sess:
+            response = await sess.execute(["show version"])
+    """
+
+    def __enter__(self):
+        raise TypeError("use 'async with' with an AsyncSession")
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _load_adapter(self, protocol):
+        return _load_protocol_adapter("async_" + protocol)
+
+    def _discard(self):
+        import asyncio
+        conn, self._conn = self._conn, None
+        asyncio.ensure_future(conn.close())
+
+    async def _with_retry(self, stage, func):
+        if not self._retry:
+            return await func()
+
+        return await self._retry.run_async(func, on_retry=lambda *args:
+                                           self._on_retry(stage, *args))
+
+    async def _connect(self):
+        self._conn = self._protocol_adapter()
+        await self._conn.connect(self.hostname, **self.params)
+        if self.authorized:
+            await self._conn.authorize(*self.authorized)
+
+    async def connect(self):
+        await self._with_retry("connect", self._connect)
+
+    async def authorize(self, password="", username=None):
+        if self.connected:
+            await self._conn.authorize(password, username)
+        self.authorized = (password, username)
+
+    enable = authorize
+
+    async def clone(self, hostname=None, **kwargs):
+        if not hostname:
+            hostname = self.hostname
+
+        _params = copy.copy(self.params)
+        _params["retry"] = self._retry
+        params = dictmerge(_params, kwargs)
+
+        cloned = self.__class__(hostname, **params)
+        await cloned.connect()
+        return cloned
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+
+        self._conn = None
+
+    async def _execute(self, commands, **kwargs):
+        if not self.connected:
+            await self.connect()
+
+        commands = commands_from_list(commands)
+        responses, status, message = await self._conn.send(commands, **kwargs)
+        return [tuple(item) for item in responses]
+
+    async def _fetch(self, commands, **kwargs):
+        execute = lambda: self._execute(commands, **kwargs)
+        if not self._retried(commands):
+            return await execute(), None
+        return await self._with_retry("execute", execute), None
+
+    async def execute(self, commands, **kwargs):
+        try:
+            key = self._flight_key(commands, **kwargs)
+            if key is None:
+                fetched, shared = await self._fetch(commands, **kwargs), False
+            else:
+                fetched, shared = await self._flights.do_async(
+                    key, lambda: self._fetch(commands, **kwargs))
+            return self._finish_store(fetched, shared, **kwargs)
+        finally:
+            self._reset_retries()
+
+    send = execute
+
+    async def stream(self, commands, **kwargs):
+        """Yield each `Response` as soon as the adapter has it instead of
+        waiting for the whole batch of commands. Not retried"""
+
+        if not self.connected:
+            await self.connect()
+
+        store = self._make_store([], **kwargs)
+
+        commands = commands_from_list(commands)
+        async for item in self._conn.stream(commands, **kwargs):
+            response = Response(store, *item)
+            store.append(response)
+            yield response
+
+    async def execute_until(self, commands, condition, timeout, sleep=1,
+                            exclude=False, **kwargs):
+        """Same as `Session.execute_until`"""
+        import asyncio
+
+        timeout = timeout or env.ARCOMM_DEFAULT_TIMEOUT
+        condition = re.compile(condition)
+        deadline = time.time() + timeout
+
+        while True:
+            response = await self.execute(commands, **kwargs)
+
+            match = condition.search(str(response))
+            if bool(match) != bool(exclude):
+                return response
+
+            if time.time() + sleep > deadline:
+                break
+            await asyncio.sleep(sleep)
+
+        raise ValueError("condition did not match withing timeout period")
+
+    async def execute_while(self, commands, condition, **kwargs):
+        return await self.execute_until(commands, condition, exclude=True,
+                                        **kwargs)
+
 def session(*args, **kwargs):
     return Session(*args, **kwargs)
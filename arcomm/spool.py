@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Write pooled results to disk as they finish instead of keeping them in
+memory"""
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+
+from arcomm.response import ResponseStore
+
+def _dumps(result):
+    record = result.to_dict()
+    record["metadata"] = result.metadata
+    return (json.dumps(record, default=str) + "\n").encode("utf-8")
+
+def _loads(data):
+    return ResponseStore.from_dict(json.loads(data.decode("utf-8")))
+
+def load(path):
+    """Yield a `ResponseStore` for every record in a spool file"""
+
+    opener = gzip.open if path.endswith(".gz") else open
+
+    with opener(path, "rb") as fh:
+        for line in fh:
+            if line.strip():
+                yield _loads(line)
+
+class SpooledResult(object):
+    """Handle to a result in a spool file. Only the host, status and metadata
+    are kept in memory, the responses are read back on demand"""
+
+    def __init__(self, spool, offset, length, host, status, metadata=None):
+        self._spool = spool
+        self._offset = offset
+        self._length = length
+        self.host = host
+        self.status = status
+        self.metadata = metadata or {}
+
+    def __repr__(self):
+        return '<{} [{}]>'.format(self.__class__.__name__, self.status)
+
+    def __str__(self):
+        return self.to_yaml()
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def load(self):
+        """Read the full `ResponseStore` back from the spool"""
+        return self._spool.read(self._offset, self._length)
+
+    def to_dict(self):
+        return self.load().to_dict()
+
+    def to_yaml(self):
+        return self.load().to_yaml()
+
+    def to_json(self):
+        return self.load().to_json()
+
+class Spool(object):
+    """Append-only JSON Lines file of results
+
+    :param path: (optional) file to write, a temporary file is created if not
+                 given. Existing files are appended to
+    :param compress: (optional) gzip each record, the default when `path`
+                     ends with '.gz'
+
+    Compressed records are written as separate gzip members so each one can
+    be read back on its own, the file as a whole is still readable by
+    `gzip` and `zcat`.
+    """
+
+    def __init__(self, path=None, compress=None):
+
+        if path is None:
+            suffix = ".jsonl.gz" if compress else ".jsonl"
+            fd, path = tempfile.mkstemp(prefix="arcomm-", suffix=suffix)
+            os.close(fd)
+
+        if compress is None:
+            compress = path.endswith(".gz")
+
+        self.path = path
+        self.compress = compress
+        self.count = 0
+
+        self._fh = open(path, "ab")
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<{} [{}]>'.format(self.__class__.__name__, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return load(self.path)
+
+    @property
+    def closed(self):
+        return self._fh.closed
+
+    def write(self, result):
+        """Append the result and return a `SpooledResult` handle for it"""
+
+        data = _dumps(result)
+        if self.compress:
+            data = gzip.compress(data)
+
+        with self._lock:
+            offset = self._fh.tell()
+            self._fh.write(data)
+            self._fh.flush()
+            self.count += 1
+
+        return SpooledResult(self, offset, len(data), result.host,
+                             result.status, result.metadata)
+
+    def read(self, offset, length):
+        """Load the `ResponseStore` written at offset"""
+
+        with open(self.path, "rb") as fh:
+            fh.seek(offset)
+            data = fh.read(length)
+
+        if self.compress:
+            data = gzip.decompress(data)
+
+        return _loads(data)
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
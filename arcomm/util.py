@@ -14,7 +14,6 @@ except ImportError:
 import arcomm.env as env
 from arcomm.credentials import BasicCreds
 
-from future.utils import iteritems
 
 def to_list(data):
     """Creates a list containing the data as a single element or a new list
@@ -70,6 +69,19 @@ def to_commands(commands):
         _loc.append(_cmd)
     return _loc
 
+def prepare_commands(commands):
+    """converts commands to Eapi formatted dicts, shared by the eapi and
+    async_eapi adapters"""
+
+    formatted = []
+    for command in commands:
+        answer = command.answer or ""
+        command = command.cmd.strip()
+
+        formatted.append({"cmd": command, "input": answer})
+
+    return formatted
+
 def parse_endpoint(uri):
 
     protocol_re = r'([\w\+\-]+)?://'
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Compare the per-host overhead of the Pool engines
+
+Uses the mock protocol so no devices are needed. With the default latency of 0
+the numbers are pure engine overhead: process spawning, dispatch and pickling
+of results. Raise --latency to see how each engine copes with network-bound
+work.
+
+    $ python bench/bench_engines.py --hosts 500 --latency .05
+    $ python bench/bench_engines.py --hosts 5000 --chunksize 50
+"""
+
+from __future__ import print_function
+
+import argparse
+import pickle
+import time
+
+import arcomm
+
+def run(engine, endpoints, commands, processes, **kwargs):
+    start = time.time()
+    count = 0
+    for _ in arcomm.batch(endpoints, commands, engine=engine,
+                          processes=processes, **kwargs):
+        count += 1
+    return time.time() - start, count
+
+def main():
+    parser = argparse.ArgumentParser()
+    arg = parser.add_argument
+    arg("--hosts", type=int, default=200, help="number of mock hosts")
+    arg("--commands", type=int, default=5, help="commands sent to each host")
+    arg("--processes", type=int, default=None,
+        help="workers per engine, defaults to each engine's own default")
+    arg("--latency", type=float, default=0,
+        help="seconds each mock host waits before answering")
+    arg("--engines", nargs="+", default=["process", "thread", "asyncio"])
+    arg("--chunksize", type=int, default=None,
+        help="hosts handed to the engine per job")
+    args = parser.parse_args()
+
+    endpoints = ["mock://host{}".format(i) for i in range(args.hosts)]
+    commands = ["show version"] * args.commands
+
+    options = {"protocol": "mock"}
+    if args.latency:
+        options["latency"] = args.latency
+    if args.chunksize:
+        options["chunksize"] = args.chunksize
+
+    response = arcomm.execute(endpoints[0], commands, protocol="mock")
+    size = len(pickle.dumps(response, pickle.HIGHEST_PROTOCOL))
+    print("pickled ResponseStore: {} bytes per host".format(size))
+    print()
+
+    print("{:<10} {:>8} {:>10} {:>14}".format("engine", "hosts", "total (s)",
+                                              "per host (ms)"))
+    for engine in args.engines:
+        elapsed, count = run(engine, endpoints, commands, args.processes,
+                             **options)
+        print("{:<10} {:>8} {:>10.3f} {:>14.3f}".format(
+            engine, count, elapsed, elapsed / count * 1000))
+
+if __name__ == "__main__":
+    main()
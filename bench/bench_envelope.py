@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Compare the cost of sending a host's results from a worker process as a
+full `ResponseStore` versus the compact `ResponseStore.to_tuple` form
+
+Measures the pickled size and the CPU time to pickle, unpickle and (for the
+tuple) rebuild the store in the parent, per host.
+
+    $ python bench/bench_envelope.py --commands 10 --output-size 20000
+"""
+
+from __future__ import print_function
+
+import argparse
+import importlib
+import pickle
+import time
+
+import arcomm
+
+_async = importlib.import_module("arcomm.async")
+_worker = _async._worker
+
+def measure(dump, load, iterations):
+    start = time.time()
+    for _ in range(iterations):
+        data = dump()
+        load(data)
+    return len(data), (time.time() - start) / iterations
+
+def main():
+    parser = argparse.ArgumentParser()
+    arg = parser.add_argument
+    arg("--commands", type=int, default=5, help="commands sent to each host")
+    arg("--output-size", type=int, default=0,
+        help="pad each command's output to this many characters")
+    arg("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    commands = ["show version"] * args.commands
+    store = _worker("mock://host1", commands)
+    if args.output_size:
+        for response in store:
+            response.output = response.output.ljust(args.output_size, "x")
+
+    proto = pickle.HIGHEST_PROTOCOL
+
+    full = measure(lambda: pickle.dumps(store, proto), pickle.loads,
+                   args.iterations)
+    packed = measure(lambda: pickle.dumps(store.to_tuple(), proto),
+                     lambda data: arcomm.ResponseStore.from_tuple(
+                         pickle.loads(data)),
+                     args.iterations)
+
+    print("{:<14} {:>10} {:>14}".format("format", "bytes", "per host (us)"))
+    for name, (size, elapsed) in (("ResponseStore", full),
+                                  ("to_tuple", packed)):
+        print("{:<14} {:>10} {:>14.1f}".format(name, size, elapsed * 1e6))
+
+if __name__ == "__main__":
+    main()
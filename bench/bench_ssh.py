@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2018 Arista Networks, Inc.  All rights reserved.
+# Arista Networks, Inc. Confidential and Proprietary.
+
+"""Measure how fast the SSH adapter reads command output
+
+Runs a local paramiko server standing in for a switch's CLI. It echoes each
+command, answers with a canned output and prints a prompt. The benchmark then
+reports the per-command latency of a short command and the throughput of a
+large output like `show running-config all`. Both are measured for the
+current reader and for the previous one, which polled the channel every 10ms
+and read it 1KB at a time.
+
+    $ python bench/bench_ssh.py --commands 200 --output-size 20
+"""
+
+from __future__ import print_function
+
+import argparse
+import socket
+import threading
+import time
+from io import StringIO
+
+import paramiko
+
+import arcomm
+from arcomm.exceptions import ExecuteFailed
+from arcomm.protocols.ssh import Ssh
+
+PROMPT = "switch#"
+
+class _Server(paramiko.ServerInterface):
+
+    def __init__(self):
+        self.shell = threading.Event()
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_ERROR
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell.set()
+        return True
+
+def _running_config(size):
+    """About `size` bytes of configuration-like text. ASCII only, the legacy
+    reader fails on characters split between two reads"""
+    lines = []
+    total = 0
+    index = 0
+    while total < size:
+        line = ("interface Ethernet{0}\r\n   description uplink to spine{0} "
+                "port {0}\r\n   mtu 9214\r\n".format(index))
+        lines.append(line)
+        total += len(line.encode("utf-8"))
+        index += 1
+    return "".join(lines)
+
+def _shell(channel, outputs):
+    pending = b""
+    while True:
+        data = channel.recv(4096)
+        if not data:
+            return
+        pending += data
+        while b"\r" in pending:
+            line, pending = pending.split(b"\r", 1)
+            command = line.decode("utf-8").strip()
+            output = outputs.get(command, "")
+            reply = "{}\r\n{}\r\n{}".format(command, output, PROMPT)
+            channel.sendall(reply.encode("utf-8"))
+
+def serve(outputs):
+    """Start the stand-in server, returns its port"""
+
+    key = paramiko.RSAKey.generate(2048)
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(5)
+
+    def accept():
+        while True:
+            client, _ = listener.accept()
+            transport = paramiko.Transport(client)
+            transport.add_server_key(key)
+            server = _Server()
+            transport.start_server(server=server)
+            channel = transport.accept(10)
+            if channel is None:
+                continue
+            server.shell.wait(10)
+            thread = threading.Thread(target=_shell, args=(channel, outputs))
+            thread.daemon = True
+            thread.start()
+
+    thread = threading.Thread(target=accept)
+    thread.daemon = True
+    thread.start()
+
+    return listener.getsockname()[1]
+
+class LegacySsh(Ssh):
+    """The reader as it was: sleep until the channel is ready, then read and
+    decode 1KB at a time"""
+
+    def _send(self, command):
+        buff = StringIO()
+        errored_response = None
+
+        self._channel.sendall(str(command) + '\r')
+        while not self._channel.recv_ready():
+            time.sleep(.01)
+
+        while True:
+            try:
+                response = self._channel.recv(1024).decode("utf-8")
+            except socket.timeout:
+                raise ExecuteFailed("% Timed out while running: {}".format(
+                    command))
+
+            buff.write(response)
+            place = max(buff.tell() - 150, 0)
+            buff.seek(place)
+            window = buff.read()
+
+            if self._handle_errors(window):
+                errored_response = buff.getvalue()
+
+            self._handle_input(window, command.prompt, command.answer)
+
+            if self._handle_prompt(window):
+                data = self._clean_response(command, buff.getvalue())
+                if errored_response:
+                    raise ExecuteFailed(errored_response)
+                return data
+
+def measure(adapter, port, args, size):
+    conn = adapter()
+    conn.connect("127.0.0.1", arcomm.BasicCreds("admin", ""), port=port)
+
+    start = time.time()
+    for _ in range(args.commands):
+        conn.send([arcomm.Command("show clock")])
+    latency = (time.time() - start) / args.commands
+
+    start = time.time()
+    for _ in range(args.repeat):
+        conn.send([arcomm.Command("show running-config all")])
+    throughput = size * args.repeat / (time.time() - start) / 1e6
+
+    conn.close()
+    return latency, throughput
+
+def main():
+    parser = argparse.ArgumentParser()
+    arg = parser.add_argument
+    arg("--commands", type=int, default=200,
+        help="short commands sent to measure latency")
+    arg("--output-size", type=float, default=10,
+        help="size of the large output in MB")
+    arg("--repeat", type=int, default=3,
+        help="times the large output is read")
+    args = parser.parse_args()
+
+    config = _running_config(int(args.output_size * 1e6))
+    size = len(config.encode("utf-8"))
+    port = serve({"show clock": "Fri Jan 5 10:00:00 2018",
+                  "show running-config all": config})
+
+    print("{:<8} {:>14} {:>10}".format("reader", "latency (ms)", "MB/s"))
+    for name, adapter in (("legacy", LegacySsh), ("current", Ssh)):
+        latency, throughput = measure(adapter, port, args, size)
+        print("{:<8} {:>14.2f} {:>10.1f}".format(name, latency * 1000,
+                                                 throughput))
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
 import arcomm
+import asyncio
+import importlib
+import json
 import pytest
 import os
+import re
+import subprocess
+import sys
+import threading
 import tempfile
+import time
 from pprint import pprint
 
 NXHOST = 'bogus'
@@ -38,6 +46,51 @@ def test_entry():
     arcomm.AuthorizationFailed
     arcomm.ExecuteFailed
 
+# modules `import arcomm` must not load, they are only needed once used
+HEAVY_IMPORTS = ["arcomm.api", "arcomm.async", "arcomm.session", "asyncio",
+                 "eapi", "json", "multiprocessing", "paramiko", "socket",
+                 "ssl", "yaml"]
+
+def _import_arcomm(*options):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(arcomm.__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    code = "import sys, arcomm; print(' '.join(sys.modules))"
+    proc = subprocess.Popen([sys.executable] + list(options) + ["-c", code],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            env=env)
+    out, err = proc.communicate()
+    assert proc.returncode == 0, err
+    return out.decode().split(), err.decode()
+
+def test_lazy_import():
+    modules, _ = _import_arcomm()
+    assert [name for name in HEAVY_IMPORTS if name in modules] == []
+
+    # names are still there when used
+    from arcomm.session import Session
+    assert arcomm.Session is Session
+    assert callable(arcomm.pipeline) and callable(arcomm.session)
+    assert "Pool" in dir(arcomm)
+    assert arcomm.Pool is importlib.import_module("arcomm.async").Pool
+    with pytest.raises(AttributeError):
+        arcomm.bogus
+
+@pytest.mark.skipif(sys.version_info < (3, 7),
+                    reason="-X importtime needs python 3.7+")
+def test_import_time():
+    _, report = _import_arcomm("-X", "importtime")
+
+    # import time: self [us] | cumulative | imported package
+    times = {}
+    for line in report.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[12:].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+
+    assert [name for name in HEAVY_IMPORTS if name in times] == []
+    assert times["arcomm"] < 100000
+
 def test_uri_parsing():
     arcomm.util.parse_endpoint('eapi://admin@vswitch1')
     arcomm.util.parse_endpoint('eapi://vswitch1')
@@ -108,6 +161,875 @@ def test_batch(protocol):
     for res in pool:
         assert isinstance(res, arcomm.ResponseStore)
 
+@pytest.mark.parametrize("engine", arcomm.engines.ENGINES)
+def test_batch_engine(engine):
+    pool = arcomm.batch(['mock://host1', 'mock://host2'], ['show version'],
+                        engine=engine)
+
+    hosts = [res.host for res in pool]
+    assert hosts == ['host1', 'host2']
+
+@pytest.mark.parametrize("engine", arcomm.engines.ENGINES)
+def test_batch_unordered(engine):
+    endpoints = [('mock://slowhost', {'latency': .5}), 'mock://fasthost']
+    pool = arcomm.batch(endpoints, ['show clock'], engine=engine,
+                        processes=2, ordered=False)
+
+    hosts = [res.host for res in pool]
+    assert hosts == ['fasthost', 'slowhost']
+
+@pytest.mark.parametrize("engine", arcomm.engines.ENGINES)
+def test_batch_shared_engine(engine):
+    shared = arcomm.engines.get_engine(engine)
+
+    for _ in range(2):
+        for res in arcomm.batch(['mock://host1'], ['show version'],
+                                engine=engine, shared=True):
+            assert res.status == 'ok'
+
+    assert arcomm.engines.get_engine(engine) is shared
+
+    # engines passed in are left running
+    engine = arcomm.engines.create_engine(engine)
+    for _ in range(2):
+        for res in arcomm.batch(['mock://host1'], ['show version'],
+                                engine=engine):
+            assert res.status == 'ok'
+    engine.close()
+    engine.join()
+
+def test_hybrid_engine_failures():
+    from concurrent.futures.process import BrokenProcessPool
+
+    engine = arcomm.engines.create_engine("hybrid", processes=1)
+
+    # jobs that can't be pickled fail in the caller
+    with pytest.raises(TypeError):
+        engine.apply_async(lambda: 1).get(timeout=10)
+
+    # so do the jobs of a worker that dies
+    with pytest.raises(BrokenProcessPool):
+        engine.apply_async(os._exit, (1,)).get(timeout=10)
+    with pytest.raises(BrokenProcessPool):
+        engine.apply_async(abs, (-1,)).get(timeout=10)
+
+    engine.close()
+    engine.join()
+
+def test_batch_keep_sessions():
+    # 'async' is a keyword from Python 3.7, it can't appear in an import
+    _SESSIONS = importlib.import_module('arcomm.async')._SESSIONS
+
+    _SESSIONS.clear()
+    hits = _SESSIONS.hits
+
+    for _ in range(2):
+        for res in arcomm.batch(['mock://host1'], ['show version'],
+                                engine='thread', keep_sessions=True):
+            assert res.status == 'ok'
+
+    assert _SESSIONS.hits == hits + 1
+    assert len(_SESSIONS) == 1
+    _SESSIONS.clear()
+
+def test_session_registry():
+    registry = arcomm.registry.SessionRegistry(maxsize=1)
+
+    sess = registry.checkout('mock://host1')
+    sess.connect()
+    registry.checkin(sess)
+    assert registry.checkout('mock://host1') is sess
+    registry.checkin(sess)
+
+    # least recently used session is closed to make room
+    other = registry.checkout('mock://host2')
+    other.connect()
+    registry.checkin(other)
+    assert len(registry) == 1
+    assert not sess.connected
+
+    # dead sessions are replaced
+    other.close()
+    assert registry.checkout('mock://host2') is not other
+
+def test_session_registry_reaper():
+    from arcomm.registry import session_key
+
+    assert session_key('mock://host1', creds=('admin', '')) == \
+        session_key('host1', creds=('admin', ''), protocol='mock')
+
+    registry = arcomm.registry.SessionRegistry(idle_timeout=.2, reap=True)
+    with registry.session('mock://host1') as sess:
+        assert sess.connected
+    assert len(registry) == 1
+
+    time.sleep(.5)
+    assert len(registry) == 0
+    assert not sess.connected
+
+def test_connect_reuse():
+    registry = arcomm.registry.get_registry()
+    registry.clear()
+    hits = registry.hits
+
+    first = arcomm.execute('mock://host1', 'show version', reuse=True)
+    second = arcomm.execute('mock://host1', 'show version', reuse=True)
+    assert first.status == second.status == 'ok'
+    assert registry.hits == hits + 1
+
+    conn = arcomm.connect('mock://host1', creds=('admin', ''), reuse=True)
+    assert registry.hits == hits + 2
+    assert len(registry) == 0
+
+    arcomm.close(conn)
+    assert conn.connected
+    assert len(registry) == 1
+    registry.clear()
+
+def test_connect_reuse_options():
+    import gc
+
+    registry = arcomm.registry.get_registry()
+    registry.clear()
+    hits = registry.hits
+
+    # per-call options don't stop the session from being reused
+    cache = arcomm.cache.ResponseCache(ttl=60)
+    for encoding, timeout in (("text", 10), ("json", 20), ("text", 30)):
+        res = arcomm.execute('mock://host1', 'show version', reuse=True,
+                             encoding=encoding, timeout=timeout, cache=cache)
+        assert res.status == 'ok'
+    assert registry.hits == hits + 2
+    registry.clear()
+
+    # sessions never checked back in are forgotten
+    sess = registry.checkout('mock://host2')
+    assert registry.owns(sess)
+    del sess
+    gc.collect()
+    assert len(registry._keys) == 0
+
+def test_token_bucket():
+    bucket = arcomm.ratelimit.TokenBucket(rate=10, burst=2)
+    bucket.consume()
+    bucket.consume()
+    assert 0 < bucket.delay() <= .1
+
+def test_batch_rate_limit():
+    endpoints = ['mock://host{}'.format(i) for i in range(6)]
+
+    start = time.time()
+    for res in arcomm.batch(endpoints, ['show clock'], engine='thread',
+                            rate=10, burst=1):
+        assert res.status == 'ok'
+
+    # first host starts right away, the other 5 wait for a token each
+    assert time.time() - start >= .45
+
+def test_adaptive_limiter():
+    limiter = arcomm.ratelimit.AdaptiveLimiter(initial=4, maximum=6,
+                                               window=2)
+
+    for _ in range(6):
+        limiter.observe(.1)
+    assert limiter.limit == 6
+
+    # latency climbing past the tolerance halves the limit
+    limiter.observe(1)
+    limiter.observe(1)
+    assert limiter.limit == 3
+
+    limiter.observe(failed=True)
+    limiter.observe(.1)
+    assert limiter.limit == 1
+
+    metrics = limiter.metrics()
+    assert metrics['limit'] == 1
+    assert metrics['increases'] == 2 and metrics['decreases'] == 2
+
+def test_batch_adaptive():
+    endpoints = ['mock://host{}'.format(i) for i in range(20)]
+
+    with arcomm.background(endpoints, ['show clock'], engine='thread',
+                           adaptive={'initial': 2}, processes=10) as bg:
+        for res in bg:
+            assert res.status == 'ok'
+
+    assert bg.limiter.metrics()['limit'] > 2
+
+def test_batch_max_sessions():
+    limiter = arcomm.ratelimit.Limiter(groups={'slow*': {'max_sessions': 1}})
+    endpoints = [('mock://slow{}'.format(i), {'latency': .2}) for i in range(3)]
+
+    start = time.time()
+    for res in arcomm.batch(endpoints, ['show clock'], engine='thread',
+                            limiter=limiter):
+        assert res.status == 'ok'
+
+    # hosts in the group ran one at a time
+    assert time.time() - start >= .6
+
+@pytest.mark.parametrize("engine", arcomm.engines.ENGINES)
+def test_batch_host_timeout(engine):
+    endpoints = [('mock://stuck', {'latency': 3}), 'mock://host1']
+
+    start = time.time()
+    results = {res.host: res.status
+               for res in arcomm.batch(endpoints, ['show clock'],
+                                       engine=engine, processes=2,
+                                       host_timeout=.5)}
+
+    assert results == {'stuck': 'timedout', 'host1': 'ok'}
+    assert time.time() - start < 2
+
+@pytest.mark.parametrize("engine", arcomm.engines.ENGINES)
+def test_batch_host_timeout_queued(engine):
+    # hosts waiting for a free worker don't use up their timeout
+    endpoints = ['mock://host{}'.format(i) for i in range(6)]
+
+    results = list(arcomm.batch(endpoints, ['sleep .3'], engine=engine,
+                                processes=2, host_timeout=.5))
+
+    assert [res.status for res in results] == ['ok'] * 6
+
+@pytest.mark.parametrize("engine", arcomm.engines.ENGINES)
+def test_batch_host_timeout_holds_slot(engine):
+    # a host that timed out keeps its session slot until its job returns
+    endpoints = [('mock://stuck', {'latency': 1}), 'mock://host1']
+
+    start = time.time()
+    results = {res.host: res.status
+               for res in arcomm.batch(endpoints, ['show clock'],
+                                       engine=engine, processes=2,
+                                       max_sessions=1, keep_sessions=True,
+                                       host_timeout=.3)}
+
+    assert results == {'stuck': 'timedout', 'host1': 'ok'}
+    assert time.time() - start >= 1
+
+def test_batch_deadline():
+    endpoints = [('mock://stuck{}'.format(i), {'latency': 3})
+                 for i in range(3)]
+
+    start = time.time()
+    for res in arcomm.batch(endpoints, ['show clock'], engine='thread',
+                            max_sessions=1, deadline=.5):
+        assert res.status == 'timedout'
+
+    assert time.time() - start < 2
+
+def test_background_cancel():
+    endpoints = [('mock://stuck', {'latency': 3}), 'mock://host1']
+
+    with arcomm.background(endpoints, ['show clock'], engine='thread') as bg:
+        assert bg.cancel('mock://stuck') == 1
+
+    results = {res.host: res.status for res in bg}
+    assert results == {'stuck': 'cancelled', 'host1': 'ok'}
+
+def test_retry_policy():
+    from arcomm.retry import RetryPolicy, mkpolicy
+
+    policy = RetryPolicy(backoff=1, factor=2, max_backoff=3, jitter=.5)
+    assert .5 <= policy.delay(1) <= 1
+    assert 1 <= policy.delay(2) <= 2
+    assert 1.5 <= policy.delay(5) <= 3
+
+    assert mkpolicy(None) is None
+    assert mkpolicy(False) is None
+    assert mkpolicy(4).attempts == 4
+    assert mkpolicy({"attempts": 2, "backoff": 0}).backoff == 0
+    assert repr(mkpolicy(2)) == repr(mkpolicy(2))
+
+def test_session_retry(monkeypatch):
+    from arcomm.protocols import mock
+
+    failures = {"count": 2}
+    connect = mock.Mock.connect
+
+    def flaky_connect(self, host, **kwargs):
+        if failures["count"]:
+            failures["count"] -= 1
+            raise arcomm.ConnectFailed("Connection to {} reset".format(host))
+        return connect(self, host, **kwargs)
+
+    monkeypatch.setattr(mock.Mock, "connect", flaky_connect)
+
+    retry = {"attempts": 3, "backoff": 0}
+    session = arcomm.Session("mock://host1", retry=retry)
+    session.connect()
+    response = session.execute("show version")
+    assert response.status == "ok"
+    assert [r["stage"] for r in response.metadata["retries"]] == \
+        ["connect", "connect"]
+
+    # retries are counted per execute
+    assert "retries" not in session.execute("show version").metadata
+
+    failures["count"] = 2
+    session = arcomm.Session("mock://host1",
+                             retry=dict(retry, budget=1))
+    with pytest.raises(arcomm.ConnectFailed):
+        session.connect()
+
+def test_session_retry_execute(monkeypatch):
+    from arcomm.protocols import mock
+
+    sent = []
+
+    def failing_send(self, commands, **kwargs):
+        sent.append([str(command) for command in commands])
+        raise arcomm.ExecuteFailed("Connection reset")
+
+    monkeypatch.setattr(mock.Mock, "send", failing_send)
+
+    retry = {"attempts": 3, "backoff": 0, "budget": 3}
+    session = arcomm.Session("mock://host1", retry=retry)
+    session.connect()
+
+    # configuration may have been applied, it is never sent twice
+    with pytest.raises(arcomm.ExecuteFailed):
+        session.execute(["configure", "hostname spine1"])
+    assert len(sent) == 1
+
+    with pytest.raises(arcomm.ExecuteFailed):
+        session.execute(["show version"])
+    assert len(sent) == 4
+
+    # the budget is spent across executes
+    with pytest.raises(arcomm.ExecuteFailed):
+        session.execute(["show version"])
+    assert len(sent) == 6
+
+def test_batch_retry():
+    retry = {"attempts": 2, "backoff": .1, "jitter": 0}
+
+    started = time.time()
+    with pytest.raises(arcomm.ConnectFailed):
+        list(arcomm.batch(["mock://unreachable1"], "show version",
+                          engine="thread", retry=retry))
+    assert time.time() - started >= .1
+
+    results = list(arcomm.batch(["mock://host1", "mock://host2"],
+                                "show version", retry=retry))
+    assert [r.status for r in results] == ["ok", "ok"]
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz"])
+def test_batch_spool(suffix):
+    from arcomm.spool import SpooledResult, load
+
+    path = os.path.join(tempfile.mkdtemp(), "results" + suffix)
+    endpoints = ["mock://host{}".format(i) for i in range(5)]
+
+    results = list(arcomm.batch(endpoints, ["show version", "show bogus"],
+                                engine="thread", spool=path))
+
+    assert all(isinstance(r, SpooledResult) for r in results)
+    assert [r.host for r in results] == ["host{}".format(i) for i in range(5)]
+    assert results[3].status == "failed"
+    assert "timings" in results[3].metadata
+
+    store = results[3].load()
+    assert store.responses == ["host3: show version", "% Invalid input"]
+    assert store.to_dict() == results[3].to_dict()
+
+    assert sorted(r.host for r in load(path)) == [r.host for r in results]
+
+@pytest.mark.parametrize("engine", arcomm.engines.ENGINES)
+def test_batch_chunksize(engine):
+    endpoints = ["mock://host{}".format(i) for i in range(10)]
+    endpoints.append("mock://badauth1")
+
+    results = list(arcomm.batch(endpoints, "show version", engine=engine,
+                                processes=2, chunksize=4, ordered=False))
+
+    assert sorted(r.host for r in results) == \
+        sorted(["host{}".format(i) for i in range(10)] + ["badauth1"])
+    assert [r.status for r in results].count("failed") == 1
+
+def test_response_tuple():
+    import pickle
+
+    store = arcomm.execute("mock://host1", ["show version", "show bogus"])
+    store.metadata["timings"] = {"connect": .1, "execute": .2}
+
+    data = store.to_tuple()
+    assert len(pickle.dumps(data)) < len(pickle.dumps(store))
+
+    copy = arcomm.ResponseStore.from_tuple(pickle.loads(pickle.dumps(data)))
+    assert copy.session is None
+    assert copy.to_dict() == store.to_dict()
+    assert copy.metadata == store.metadata
+
+def test_batch_pack():
+    endpoints = ["mock://host1", "mock://host2"]
+
+    packed = list(arcomm.batch(endpoints, ["show version"], engine="process"))
+    assert [r.session for r in packed] == [None, None]
+
+    whole = list(arcomm.batch(endpoints, ["show version"], engine="process",
+                              pack=False))
+    assert [r.session.hostname for r in whole] == ["host1", "host2"]
+    assert [r.to_dict() for r in whole] == [r.to_dict() for r in packed]
+
+def test_rollout_plan():
+    from arcomm.rollout import plan
+
+    waves = [(wave["name"], start, stop) for wave, start, stop in plan(100)]
+    assert waves == [("canary", 0, 1), ("5%", 1, 5), ("25%", 5, 25),
+                     ("100%", 25, 100)]
+
+    # waves too small to add hosts are dropped
+    assert [wave["name"] for wave, _, _ in plan(3)] == ["canary", "100%"]
+
+@pytest.mark.parametrize("max_error_rate", [0, .5])
+def test_rollout(max_error_rate):
+    endpoints = ["mock://host{}".format(i) for i in range(20)]
+    endpoints[2] = "mock://badauth1"
+
+    rollout = arcomm.rollout(endpoints, "show version", engine="thread",
+                             max_error_rate=max_error_rate)
+    results = list(rollout)
+
+    if max_error_rate:
+        assert rollout.aborted is None
+        assert len(results) == 20
+        assert rollout.summary[1] == ("25%", 4, 1)
+    else:
+        assert rollout.aborted == "25%"
+        assert set(endpoints[5:]) <= set(rollout.skipped)
+        assert len(results) + len(rollout.skipped) == 20
+        assert [r.status for r in results].count("failed") == 1
+
+def test_history():
+    from arcomm.history import History, longest_first_order
+
+    path = os.path.join(tempfile.mkdtemp(), "history.json")
+    history = History(path, weight=.5)
+    history.record("mock://host1", ["show version"], 1.0)
+    history.record("host1", "show version", 3.0)
+    history.record("host2", "show version", 5.0)
+    history.save()
+
+    history = History(path)
+    assert history.expected("host1", ["show version"]) == 2.0
+    assert history.expected("host1", ["show tech-support"]) is None
+
+    endpoints = ["host0", "host1", "host2", "host3"]
+    # hosts without history are assumed to take the average time
+    assert longest_first_order(endpoints, "show version", history) == \
+        [2, 0, 3, 1]
+    assert longest_first_order(endpoints, "show version", history,
+                               [0, 0, 0, 1]) == [3, 2, 0, 1]
+
+def test_batch_longest_first():
+    from arcomm.history import History
+
+    history = History(None)
+    endpoints = [("mock://host{}".format(i), {"latency": .01 * i})
+                 for i in range(4)]
+
+    list(arcomm.batch(endpoints, "show version", engine="thread",
+                      longest_first=history))
+    assert len(history) == 4
+
+    results = list(arcomm.batch(endpoints, "show version", engine="thread",
+                                processes=1, ordered=False,
+                                longest_first=history))
+    assert [r.host for r in results] == ["host3", "host2", "host1", "host0"]
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_pipeline(ordered):
+    endpoints = ["mock://host{}".format(i) for i in range(10)]
+    endpoints[4] = "mock://unreachable1"
+
+    results = list(arcomm.pipeline(endpoints, "show version", connectors=4,
+                                   executors=2, queue_size=1, ordered=ordered,
+                                   postprocess=lambda r: (r.host, r.status)))
+
+    expected = [("host{}".format(i), "ok") for i in range(10)]
+    expected[4] = ("unreachable1", "failed")
+    if ordered:
+        assert results == expected
+    else:
+        assert sorted(results) == sorted(expected)
+
+def test_pipeline_errors():
+    def postprocess(result):
+        if result.host == "host2":
+            raise RuntimeError("bad output")
+        return result
+
+    results = list(arcomm.pipeline(["mock://host1", "bad_host!",
+                                    "mock://host2"], "show version",
+                                   postprocess=postprocess, ordered=True))
+
+    assert [(r.host, r.status) for r in results] == \
+        [("host1", "ok"), ("bad_host!", "failed"), ("host2", "failed")]
+    assert "Invalid URI" in results[1].responses[0]
+    assert "bad output" in results[2].responses[0]
+
+def test_pipeline_queue_size(monkeypatch):
+    lock = threading.Lock()
+    idle = [0, 0]
+
+    connect = arcomm.Session.connect
+    execute = arcomm.Session.execute
+
+    def counting_connect(self, *args, **kwargs):
+        connect(self, *args, **kwargs)
+        with lock:
+            idle[0] += 1
+            idle[1] = max(idle)
+
+    def counting_execute(self, *args, **kwargs):
+        with lock:
+            idle[0] -= 1
+        time.sleep(.02)
+        return execute(self, *args, **kwargs)
+
+    monkeypatch.setattr(arcomm.Session, "connect", counting_connect)
+    monkeypatch.setattr(arcomm.Session, "execute", counting_execute)
+
+    endpoints = ["mock://host{}".format(i) for i in range(12)]
+    results = list(arcomm.pipeline(endpoints, "show version", connectors=8,
+                                   executors=1, queue_size=2))
+    assert len(results) == 12
+    assert idle[1] <= 2
+
+def test_pipeline_timings():
+    result = next(iter(arcomm.pipeline(["mock://host1"], "show version",
+                                       latency=.05)))
+    timings = result.metadata["timings"]
+    assert set(timings) == set(["connect", "queued", "execute"])
+    assert timings["execute"] >= .05
+
+def test_response_cache():
+    cache = arcomm.cache.ResponseCache(maxsize=2, ttl=60,
+                                       ttls={"show clock": 0,
+                                             "show interfaces": .05})
+
+    assert cache.cacheable(arcomm.Command("show version"))
+    assert not cache.cacheable(arcomm.Command("show clock"))
+    assert not cache.cacheable(arcomm.Command("configure"))
+
+    sess = arcomm.Session("mock://host1", cache=cache)
+    first = sess.execute(["show version", "show interfaces"])
+    second = sess.execute(["show version", "show interfaces"])
+    assert first.metadata["cache_hits"] == 0
+    assert second.metadata["cache_hits"] == 2
+    assert [r.output for r in second] == [r.output for r in first]
+
+    time.sleep(.05)
+    assert sess.execute(["show interfaces"]).metadata["cache_hits"] == 0
+
+    # mutating commands bypass the cache and drop the host's entries
+    sess.execute(["configure", "end"])
+    assert sess.execute(["show version"]).metadata["cache_hits"] == 0
+    assert cache.stats() == {"hits": 2, "misses": 4, "bypasses": 1,
+                             "size": 1}
+
+    # least recently used entries are dropped
+    sess.execute(["show inventory"])
+    sess.execute(["show hostname"])
+    assert sess.execute(["show version"]).metadata["cache_hits"] == 0
+
+def test_response_cache_authorize():
+    cache = arcomm.cache.ResponseCache()
+
+    first = arcomm.execute("mock://host1", "show version", cache=cache,
+                           authorize="s3cr3t")
+    assert first.status == "ok"
+    assert first.session._conn._authorized
+
+    # answered from the cache, the session never connects
+    second = arcomm.execute("mock://host1", "show version", cache=cache,
+                            authorize="s3cr3t")
+    assert second.metadata["cache_hits"] == 1
+    assert not second.session.connected
+
+    # unprivileged output is cached separately
+    third = arcomm.execute("mock://host1", "show version", cache=cache)
+    assert third.metadata["cache_hits"] == 0
+
+def test_coalesce():
+    flights = arcomm.coalesce.SingleFlight()
+    sess = arcomm.Session("mock://host1", coalesce=flights)
+    sess.connect()
+
+    results = []
+    def run(commands):
+        results.append(sess.execute(commands, latency=.2))
+
+    threads = [threading.Thread(target=run, args=(["show version"],))
+               for _ in range(4)]
+    threads.append(threading.Thread(target=run, args=(["show clock"],)))
+
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.time() - started < .6
+    assert flights.shared == 3
+    assert len(flights) == 0
+    assert sum(1 for r in results if r.metadata.get("coalesced")) == 3
+    assert set(str(r[0].output) for r in results) == set(
+        ["host1: show version", "host1: show clock"])
+
+    # mutating commands are never shared
+    assert sess._flight_key(["configure"]) is None
+
+def test_coalesce_async():
+    async def run():
+        sess = arcomm.AsyncSession("mock://host1", coalesce=True)
+        results = await asyncio.gather(*[
+            sess.execute(["show version"], latency=.05) for _ in range(3)])
+        await sess.close()
+        return results
+
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert sorted(bool(r.metadata.get("coalesced")) for r in results) == [
+        False, True, True]
+
+def test_protocol_adapters(monkeypatch):
+    from arcomm.protocols import adapters
+    from arcomm.protocols.mock import Mock
+
+    class Echo(Mock):
+        pass
+
+    class EntryPoint(object):
+        name = "plugin"
+        def load(self):
+            return Echo
+
+    monkeypatch.setattr(adapters, "_ADAPTERS", dict(adapters._ADAPTERS))
+    monkeypatch.setattr(adapters, "_discovered", False)
+    monkeypatch.setattr(adapters, "_entry_points", lambda: [EntryPoint()])
+
+    adapters.register_adapter("echo", "arcomm.protocols.mock:Mock")
+    assert adapters.get_adapter("echo") is Mock
+    # resolved once, then cached
+    assert adapters._ADAPTERS["echo"] is Mock
+
+    assert "plugin" in adapters.available()
+    sess = arcomm.Session("plugin://host1")
+    assert sess._protocol_adapter is Echo
+
+    with pytest.raises(arcomm.exceptions.ProtocolException):
+        arcomm.Session("bogus://host1")
+
+def test_auto_protocol(monkeypatch, tmpdir):
+    from arcomm.protocols import adapters
+    from arcomm.protocols.auto import TransportMemo
+    from arcomm.protocols.mock import Mock
+
+    attempts = []
+
+    class Down(Mock):
+        def connect(self, host, **kwargs):
+            attempts.append("down")
+            raise arcomm.ConnectFailed("connection refused")
+
+    class Up(Mock):
+        def connect(self, host, **kwargs):
+            attempts.append("up+" + kwargs["transport"])
+            super(Up, self).connect(host, **kwargs)
+
+    monkeypatch.setattr(adapters, "_ADAPTERS", dict(adapters._ADAPTERS,
+                                                    down=Down, up=Up))
+
+    path = str(tmpdir.join("transports.json"))
+    protocols = ["down", "up+https", "mock"]
+
+    with arcomm.Session("auto://host1", protocols=protocols,
+                        transport_memo=TransportMemo(path)) as sess:
+        assert sess._conn.protocol == "up+https"
+        assert str(sess.execute("show version")[0].output) == \
+            "host1: show version"
+    assert attempts == ["down", "up+https"]
+
+    # the next run, with a fresh memo read from disk, goes straight to it
+    del attempts[:]
+    memo = TransportMemo(path)
+    assert memo.order("host1", protocols) == ["up+https", "mock", "down"]
+    arcomm.Session("auto://host1", protocols=protocols,
+                   transport_memo=memo).connect()
+    assert attempts == ["up+https"]
+
+    with pytest.raises(arcomm.ConnectFailed):
+        arcomm.Session("auto://unreachable1", protocols=["down", "mock"],
+                       transport_memo=memo).connect()
+
+def test_ssh_reader():
+    pytest.importorskip("paramiko")
+    import socket
+    from arcomm.protocols.ssh import Ssh
+
+    class Channel(object):
+        """One end of a socket pair standing in for a paramiko channel"""
+        def __init__(self, sock):
+            self.sock = sock
+        def fileno(self):
+            return self.sock.fileno()
+        def settimeout(self, timeout):
+            self.timeout = timeout
+        def gettimeout(self):
+            return self.timeout
+        def recv_ready(self):
+            return False
+        def recv(self, size):
+            return self.sock.recv(size)
+        def sendall(self, data):
+            self.sock.sendall(data.encode("utf-8"))
+
+    ours, theirs = socket.socketpair()
+    ssh = Ssh()
+    ssh._timeout = .5
+    ssh._attach(Channel(ours))
+
+    # large output with a multi-byte character split between two sends
+    output = "interface Ethernet1\r\n   description → spine\r\n" * 5000
+    encoded = ("show run\r\n" + output + "switch#").encode("utf-8")
+    split = encoded.index("→".encode("utf-8")) + 1
+
+    def reply():
+        theirs.recv(1024)
+        theirs.sendall(encoded[:split])
+        time.sleep(.05)
+        theirs.sendall(encoded[split:])
+
+    thread = threading.Thread(target=reply)
+    thread.start()
+    response = ssh._send(arcomm.Command("show run"))
+    thread.join()
+
+    assert response == output.replace("\r\n", "\n").rstrip("\n")
+
+    with pytest.raises(arcomm.ExecuteFailed) as excinfo:
+        ssh._send(arcomm.Command("show clock"))
+    assert "Timed out" in str(excinfo.value)
+    # drop the unanswered command so hangup reads the next one
+    theirs.recv(1024)
+
+    def hangup():
+        theirs.recv(1024)
+        theirs.close()
+
+    thread = threading.Thread(target=hangup)
+    thread.start()
+    with pytest.raises(arcomm.ExecuteFailed) as excinfo:
+        ssh._send(arcomm.Command("show clock"))
+    thread.join()
+    assert "Connection closed" in str(excinfo.value)
+    ours.close()
+
+def test_async_session():
+    async def run():
+        async with arcomm.AsyncSession("mock://host1") as sess:
+            store = await sess.execute(["show version", "show bogus"])
+            streamed = [response async for response in
+                        sess.stream(["sleep .01", "show clock"])]
+        return store, streamed, sess.connected
+
+    loop = asyncio.new_event_loop()
+    try:
+        store, streamed, connected = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert [r.errored for r in store] == [False, True]
+    assert store[0].output == "host1: show version"
+    assert [str(r.command) for r in streamed] == ["sleep .01", "show clock"]
+    assert not connected
+
+def test_async_eapi():
+    requests = []
+
+    async def handle(reader, writer):
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError:
+                return
+            length = int(re.search(rb"Content-Length: (\d+)", head).group(1))
+            payload = json.loads((await reader.readexactly(length)).decode())
+            requests.append(payload)
+            result = [{"output": "ran " + cmd["cmd"]}
+                      for cmd in payload["params"]["cmds"]]
+            body = json.dumps({"jsonrpc": "2.0", "id": payload["id"],
+                               "result": result}).encode()
+            # the reason phrase may be left out
+            status = b"HTTP/1.1 200 OK" if len(requests) == 1 else \
+                b"HTTP/1.1 200"
+            writer.write(status + b"\r\nContent-Length: " +
+                         str(len(body)).encode() + b"\r\n\r\n" + body)
+
+    async def run():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            async with arcomm.AsyncSession("eapi+http://localhost",
+                                           port=port) as sess:
+                await sess.authorize("s3cr3t")
+                first = await sess.execute(["show version"])
+                second = await sess.execute(["show clock"])
+            # let the handler see the connection close
+            await asyncio.sleep(.01)
+        finally:
+            server.close()
+        return first, second
+
+    loop = asyncio.new_event_loop()
+    try:
+        first, second = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    assert first[0].output == "ran show version"
+    assert second[0].output == "ran show clock"
+    assert len(requests) == 2
+    assert requests[0]["params"]["cmds"][0] == {"cmd": "enable",
+                                                 "input": "s3cr3t"}
+
+def test_poll():
+    converged = []
+    polls = {"host1": 0, "host2": 0}
+
+    def ready(response):
+        polls[response.host] += 1
+        return response.host == "host1" or polls["host2"] >= 3
+
+    poller = arcomm.poll(["mock://host1", "mock://host2", "mock://host3"],
+                         ["show version"],
+                         lambda r: r.host != "host3" and ready(r),
+                         interval=.02, backoff=2, deadline=.5,
+                         callback=converged.append)
+    results = list(poller)
+
+    assert [r.host for r in converged] == ["host1", "host2"]
+    assert [r.status for r in results] == ["ok", "ok", "timedout"]
+    assert poller.pending == ["host3"]
+    assert list(poller.converged) == ["host1", "host2"]
+    assert poller.polls[:2] == [1, 3]
+    assert results[1].metadata["polls"] == 3
+
+def test_poll_errors():
+    poller = arcomm.poll(["mock://unreachable1", "mock://host1"],
+                         ["show version"], r"show version", interval=.01,
+                         deadline=.2)
+    summary = poller.run()
+    assert list(summary["converged"]) == ["host1"]
+    assert summary["pending"] == ["unreachable1"]
+    assert "ConnectFailed" in summary["errors"]["unreachable1"]
+
 def test_batch_until():
 
     pool = arcomm.batch([HOST, HOST], ['show clock'], condition=r'\:[0-5]0',